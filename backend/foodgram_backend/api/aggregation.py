@@ -0,0 +1,112 @@
+from collections import defaultdict
+
+from django.db.models import (BigIntegerField, Case, CharField, F, Sum,
+                              Value, When)
+from django.db.models.functions import Cast
+
+from recipes.constants import UNIT_CONVERSIONS
+from recipes.models import Ingredient, IngredientRecipe
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def sum_by_ingredient(recipe_ids):
+    """
+    Суммирует количество ингредиентов по набору рецептов.
+
+    Строки IngredientRecipe загружаются одним запросом в целочисленные
+    массивы и суммируются группировкой по id ингредиента (np.bincount).
+    recipe_ids может быть списком или подзапросом. Возвращает словарь
+    {id ингредиента: количество}.
+    """
+    rows = IngredientRecipe.objects.filter(
+        recipe__in=recipe_ids
+    ).order_by().values_list('ingredient_id', 'amount')
+
+    if np is None:
+        totals = defaultdict(int)
+        for ingredient_id, amount in rows:
+            totals[ingredient_id] += amount
+        return dict(totals)
+
+    data = np.fromiter(
+        (value for row in rows for value in row), dtype=np.int64
+    ).reshape(-1, 2)
+    if not len(data):
+        return {}
+    ingredient_ids, amounts = data[:, 0], data[:, 1]
+    sums = np.bincount(ingredient_ids, weights=amounts).astype(np.int64)
+    present = np.flatnonzero(np.bincount(ingredient_ids))
+    return dict(zip(present.tolist(), sums[present].tolist()))
+
+
+def aggregate_ingredients(recipe_ids):
+    """
+    Сводка ингредиентов для набора рецептов.
+
+    Возвращает список ингредиентов с суммарным количеством,
+    отсортированный по названию, и суммы по единицам измерения.
+    """
+    totals = sum_by_ingredient(recipe_ids)
+    ingredients = [
+        {
+            'id': ingredient.id,
+            'name': ingredient.name,
+            'measurement_unit': ingredient.measurement_unit,
+            'amount': totals[ingredient.id],
+        }
+        for ingredient in Ingredient.objects.filter(
+            id__in=totals
+        ).order_by('name')
+    ]
+    units = defaultdict(int)
+    for ingredient in ingredients:
+        units[ingredient['measurement_unit']] += ingredient['amount']
+    return {
+        'ingredients': ingredients,
+        'units': [
+            {'measurement_unit': unit, 'amount': amount}
+            for unit, amount in sorted(units.items())
+        ],
+    }
+
+
+def shopping_cart_totals(user):
+    """
+    Список покупок пользователя одним сгруппированным запросом.
+
+    Количество умножается на число порций в корзине и приводится
+    к базовой единице по UNIT_CONVERSIONS (кг -> г, л -> мл), поэтому
+    один продукт в разных единицах суммируется в одну строку.
+    """
+    unit_field = 'ingredient__measurement_unit'
+    unit = Case(
+        *(
+            When(**{unit_field: unit}, then=Value(base_unit))
+            for unit, (base_unit, _) in UNIT_CONVERSIONS.items()
+        ),
+        default=F(unit_field),
+        output_field=CharField(),
+    )
+    factor = Case(
+        *(
+            When(**{unit_field: unit}, then=Value(factor))
+            for unit, (_, factor) in UNIT_CONVERSIONS.items()
+        ),
+        default=Value(1),
+        output_field=BigIntegerField(),
+    )
+    return IngredientRecipe.objects.filter(
+        recipe__shopping_list__user=user
+    ).values(
+        name=F('ingredient__name'), unit=unit
+    ).annotate(
+        amount=Sum(
+            Cast('amount', BigIntegerField())
+            * F('recipe__shopping_list__servings')
+            * factor
+        )
+    ).order_by('name')
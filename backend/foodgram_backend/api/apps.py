@@ -1,7 +1,27 @@
+import logging
+
 from django.apps import AppConfig
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
 
 
 class ApiAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
     verbose_name = 'Api Фудграм'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        if (
+            settings.RESPONSE_CACHE
+            and not settings.CACHE_SHARED
+            and not settings.DEBUG
+        ):
+            logger.warning(
+                'RESPONSE_CACHE включён с кэшем %s, локальным для процесса: '
+                'изменения рецептов и справочников не дойдут до других '
+                'воркеров. Задайте общий CACHE_BACKEND.',
+                settings.CACHES['default']['BACKEND'],
+            )
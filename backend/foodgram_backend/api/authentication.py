@@ -0,0 +1,132 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+
+
+class LRUCache:
+    """Потокобезопасный LRU-кэш ограниченного размера с временем жизни."""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+token_cache = LRUCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL)
+
+USER_GENERATION_KEY = 'auth:user:{}:generation'
+
+
+def shared_cache_key(key):
+    return f'auth:token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def get_generation(user_id):
+    """Поколение токенов пользователя в общем кэше Django."""
+    key = USER_GENERATION_KEY.format(user_id)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def invalidate_tokens(keys, user_id):
+    """
+    Сбрасывает закэшированные токены пользователя во всех процессах.
+
+    Новое поколение делает недействительными записи в LRU-кэшах
+    других процессов. Оно выставляется сразу и ещё раз после фиксации
+    транзакции, чтобы запрос, прочитавший старые данные до фиксации, не
+    закэшировал их под новым поколением.
+    """
+    keys = tuple(keys)
+    for key in keys:
+        token_cache.delete(key)
+    if settings.TOKEN_CACHE_SHARED and keys:
+        cache.delete_many([shared_cache_key(key) for key in keys])
+
+    def bump():
+        cache.set(
+            USER_GENERATION_KEY.format(user_id), time.time_ns(),
+            timeout=None
+        )
+
+    bump()
+    transaction.on_commit(bump)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication с кэшем соответствия токен - пользователь.
+
+    Токены хранятся в LRU-кэше процесса, а при TOKEN_CACHE_SHARED ещё и в
+    кэше Django, вместе с поколением токенов пользователя. Поколение
+    меняется сигналами при удалении токена, выходе и изменении
+    пользователя; попадание в кэш проверяет его одним запросом к кэшу
+    Django, без запроса к БД. С кэшем Django, общим для процессов
+    (CACHE_BACKEND), сброс виден всем воркерам сразу, с локальным -
+    через TOKEN_CACHE_TTL.
+    """
+
+    def get_cached(self, key):
+        entry = token_cache.get(key)
+        if entry is None and settings.TOKEN_CACHE_SHARED:
+            entry = cache.get(shared_cache_key(key))
+            if entry is not None:
+                token_cache.set(key, entry)
+        if entry is None:
+            return None
+        generation, credentials = entry
+        if generation != get_generation(credentials[0].pk):
+            return None
+        return credentials
+
+    def authenticate_credentials(self, key):
+        credentials = self.get_cached(key)
+        if credentials is None:
+            credentials = super().authenticate_credentials(key)
+            entry = (get_generation(credentials[0].pk), credentials)
+            token_cache.set(key, entry)
+            if settings.TOKEN_CACHE_SHARED:
+                cache.set(
+                    shared_cache_key(key), entry, settings.TOKEN_CACHE_TTL
+                )
+        user, token = map(copy.copy, credentials)
+        token.user = user
+        return user, token
@@ -0,0 +1,258 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from .compression import accepted_encodings, compress_bodies, set_encoding
+
+LIST_VERSION_KEY = 'recipes:list:version'
+RECIPE_VERSION_KEY = 'recipe:{}:version'
+RECIPE_FRAGMENT_KEY = 'recipe:{}:fragment:{}'
+CATALOG_VERSION_KEY = 'catalog:{}:version'
+CATALOG_KEY = 'catalog:{}:{}:{}'
+FIELDSET_PARAMS = ('fields', 'expand')
+LIST_PARAMS = ('tags', 'author', 'page', 'limit') + FIELDSET_PARAMS
+
+
+def _get_version(key, timeout=None):
+    """Версия данных - время последнего изменения в наносекундах."""
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=timeout)
+        version = cache.get(key)
+    return version
+
+
+def get_list_version():
+    return _get_version(LIST_VERSION_KEY)
+
+
+def recipe_version_timeout():
+    """
+    Версии рецептов живут дольше закэшированных по ним ответов.
+
+    Ключ создаётся по pk из URL, в том числе для несуществующих
+    рецептов, поэтому бессрочно хранить его нельзя. После истечения
+    версия создаётся заново с текущим временем, и старые записи
+    просто перестают находиться.
+    """
+    return 2 * settings.RECIPE_CACHE_TIMEOUT
+
+
+def get_recipe_version(pk):
+    return _get_version(
+        RECIPE_VERSION_KEY.format(pk), recipe_version_timeout()
+    )
+
+
+def bump_versions(recipe_ids=(), list_version=True):
+    """Инвалидирует кэш списка и перечисленных рецептов."""
+    version = time.time_ns()
+    cache.set_many(
+        {RECIPE_VERSION_KEY.format(pk): version for pk in recipe_ids},
+        recipe_version_timeout()
+    )
+    if list_version:
+        cache.set(LIST_VERSION_KEY, version, timeout=None)
+
+
+def get_catalog_version(name):
+    return _get_version(
+        CATALOG_VERSION_KEY.format(name), 2 * settings.CATALOG_CACHE_TIMEOUT
+    )
+
+
+def bump_catalog_version(name):
+    cache.set(
+        CATALOG_VERSION_KEY.format(name), time.time_ns(),
+        2 * settings.CATALOG_CACHE_TIMEOUT
+    )
+
+
+def get_recipe_fragments(pks, host=''):
+    """
+    Возвращает актуальные фрагменты рецептов и их версии.
+
+    Версии и фрагменты читаются одним get_many. Фрагмент хранится
+    вместе с версией, на которой он был построен, и считается
+    актуальным, только если она совпадает с текущей. Без
+    RESPONSE_CACHE фрагменты не читаются и не сохраняются.
+    """
+    if not settings.RESPONSE_CACHE:
+        return {}, {}
+    version_keys = {pk: RECIPE_VERSION_KEY.format(pk) for pk in pks}
+    fragment_keys = {pk: RECIPE_FRAGMENT_KEY.format(pk, host) for pk in pks}
+    found = cache.get_many(
+        (*version_keys.values(), *fragment_keys.values())
+    )
+    fragments, versions = {}, {}
+    for pk in pks:
+        version = found.get(version_keys[pk])
+        if version is None:
+            version = get_recipe_version(pk)
+        versions[pk] = version
+        fragment_version, fragment = found.get(fragment_keys[pk], (0, None))
+        if fragment_version == version:
+            fragments[pk] = fragment
+    return fragments, versions
+
+
+def set_recipe_fragments(fragments, versions, host=''):
+    if not settings.RESPONSE_CACHE:
+        return
+    cache.set_many(
+        {
+            RECIPE_FRAGMENT_KEY.format(pk, host): (versions[pk], fragment)
+            for pk, fragment in fragments.items()
+        },
+        settings.RECIPE_CACHE_TIMEOUT
+    )
+
+
+def params_key(request, names):
+    """Нормализованные параметры запроса для ключа кэша."""
+    params = []
+    for name in names:
+        values = sorted({
+            value
+            for raw in request.query_params.getlist(name)
+            for value in raw.split(',')
+        })
+        if values:
+            params.append(f'{name}={",".join(values)}')
+    return "&".join(params)
+
+
+def list_cache_key(request, version):
+    """Ключ кэша списка из нормализованных параметров запроса."""
+    return f'recipes:list:{version}:{params_key(request, LIST_PARAMS)}'
+
+
+class AnonymousCacheMixin:
+    """
+    Кэширование list/retrieve для анонимных пользователей.
+
+    Для анонимов is_favorited и is_in_shopping_cart всегда False,
+    поэтому ответ одинаков для всех и хранится в кэше Django до смены
+    версии. Ответы дополняются ETag, Last-Modified и Cache-Control,
+    чтобы их мог кэшировать и nginx. Без RESPONSE_CACHE ответы
+    не кэшируются.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if not settings.RESPONSE_CACHE:
+            return super().list(request, *args, **kwargs)
+        version = get_list_version()
+        return self.get_cached_response(
+            super().list, list_cache_key(request, version), version,
+            request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        if not settings.RESPONSE_CACHE:
+            return super().retrieve(request, *args, **kwargs)
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        version = get_recipe_version(pk)
+        return self.get_cached_response(
+            super().retrieve,
+            f'recipe:{pk}:{version}:{params_key(request, FIELDSET_PARAMS)}',
+            version,
+            request, *args, **kwargs
+        )
+
+    def get_cached_response(self, handler, key, version, request,
+                            *args, **kwargs):
+        if request.user.is_authenticated:
+            response = handler(request, *args, **kwargs)
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ('Authorization',))
+            return response
+
+        data = cache.get(key)
+        if data is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            cache.set(key, response.data, settings.RECIPE_CACHE_TIMEOUT)
+        else:
+            response = Response(data)
+
+        etag = quote_etag(hashlib.md5(key.encode()).hexdigest())
+        last_modified = version // 10**9
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(
+            response, public=True, max_age=settings.RECIPE_CACHE_MAX_AGE
+        )
+        patch_vary_headers(response, ('Authorization',))
+        return get_conditional_response(
+            request, etag=etag, last_modified=last_modified,
+            response=response
+        )
+
+
+class CatalogCacheMixin:
+    """
+    Готовые тела ответа list для справочников (теги, ингредиенты).
+
+    Список без параметров рендерится и сжимается один раз на версию
+    справочника (catalog_name) и хранится не дольше
+    CATALOG_CACHE_TIMEOUT. Версия лежит в общем кэше и меняется
+    сигналами при изменении записей в любом процессе, ETag считается
+    по содержимому. Запросы с фильтрами и все запросы без
+    RESPONSE_CACHE обрабатываются как обычно.
+    """
+
+    catalog_name = None
+
+    def list(self, request, *args, **kwargs):
+        if (
+            not settings.RESPONSE_CACHE
+            or request.query_params
+            or request.accepted_renderer.format != 'json'
+        ):
+            return super().list(request, *args, **kwargs)
+
+        version = get_catalog_version(self.catalog_name)
+        key = CATALOG_KEY.format(
+            self.catalog_name, version, request.accepted_media_type
+        )
+        cached = cache.get(key)
+        if cached is None:
+            data = self.get_serializer(
+                self.filter_queryset(self.get_queryset()), many=True
+            ).data
+            bodies = compress_bodies(request.accepted_renderer.render(
+                data, request.accepted_media_type,
+                self.get_renderer_context()
+            ))
+            etag = quote_etag(hashlib.md5(bodies['identity']).hexdigest())
+            cache.set(key, (etag, bodies), settings.CATALOG_CACHE_TIMEOUT)
+        else:
+            etag, bodies = cached
+
+        encoding = next(
+            (
+                encoding for encoding in accepted_encodings(request)
+                if encoding in bodies
+            ),
+            'identity'
+        )
+        response = HttpResponse(
+            bodies[encoding], content_type=request.accepted_media_type
+        )
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(version // 10**9)
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if encoding != 'identity':
+            set_encoding(response, encoding)
+        return get_conditional_response(
+            request, etag=response['ETag'],
+            last_modified=version // 10**9, response=response
+        )
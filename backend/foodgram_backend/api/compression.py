@@ -0,0 +1,106 @@
+import gzip
+import re
+
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+API_PREFIX = '/api/'
+COMPRESSIBLE_TYPES = ('application/json',)
+ACCEPT_ENCODING_RE = re.compile(r'\s*([\w*-]+)\s*(?:;\s*q=([\d.]+))?')
+
+
+def compress(body, encoding, best=False):
+    """Сжимает тело; best - максимальная степень для разового сжатия."""
+    if encoding == 'br':
+        return brotli.compress(
+            body, quality=11 if best else settings.BROTLI_QUALITY
+        )
+    return gzip.compress(
+        body, compresslevel=9 if best else settings.GZIP_LEVEL, mtime=0
+    )
+
+
+def accepted_encodings(request):
+    """Поддерживаемые кодировки из Accept-Encoding в порядке предпочтения."""
+    supported = ('br', 'gzip') if brotli else ('gzip',)
+    weights = {}
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        match = ACCEPT_ENCODING_RE.match(item)
+        if match:
+            weight = match.group(2)
+            weights[match.group(1).lower()] = (
+                float(weight) if weight else 1.0
+            )
+    default = weights.get('*', 0)
+    return [
+        encoding for encoding in sorted(
+            supported,
+            key=lambda encoding: -weights.get(encoding, default),
+        )
+        if weights.get(encoding, default) > 0
+    ]
+
+
+def compress_bodies(body):
+    """Тело ответа во всех поддерживаемых кодировках, сжатое максимально."""
+    bodies = {'identity': body}
+    if len(body) >= settings.COMPRESSION_MIN_SIZE:
+        for encoding in ('br', 'gzip') if brotli else ('gzip',):
+            bodies[encoding] = compress(body, encoding, best=True)
+    return bodies
+
+
+def set_encoding(response, encoding):
+    """Помечает ответ как сжатый: Content-Encoding и слабый ETag."""
+    response.headers['Content-Encoding'] = encoding
+    patch_vary_headers(response, ('Accept-Encoding',))
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response.headers['ETag'] = 'W/' + etag
+
+
+class CompressionMiddleware:
+    """
+    Сжатие ответов gzip или brotli по Accept-Encoding.
+
+    Сжимаются только JSON-ответы API не меньше COMPRESSION_MIN_SIZE
+    байт; уже сжатые и потоковые ответы пропускаются. Остальные ответы
+    (админка, HTML браузируемого API с CSRF-токенами) сжимает
+    GZipMiddleware с защитой от BREACH.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.gzip = GZipMiddleware(get_response)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not request.path.startswith(API_PREFIX) or not response.get(
+            'Content-Type', ''
+        ).startswith(COMPRESSIBLE_TYPES):
+            return self.gzip.process_response(request, response)
+        if (
+            response.streaming
+            or response.has_header('Content-Encoding')
+        ):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        encodings = accepted_encodings(request)
+        if not encodings:
+            return response
+        content = compress(response.content, encodings[0])
+        if len(content) >= len(response.content):
+            return response
+        response.content = content
+        response.headers['Content-Length'] = str(len(content))
+        set_encoding(response, encodings[0])
+        return response
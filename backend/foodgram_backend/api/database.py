@@ -0,0 +1,139 @@
+import logging
+import time
+from contextlib import ExitStack
+from functools import partial
+from http import HTTPStatus
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import (DatabaseError, OperationalError, connection,
+                       connections)
+from rest_framework.exceptions import APIException
+
+from .profiling import view_name
+
+logger = logging.getLogger(__name__)
+
+QUERY_CANCELED = '57014'
+
+
+class StatementTimeout(APIException):
+    status_code = HTTPStatus.SERVICE_UNAVAILABLE
+    default_detail = 'Запрос выполнялся слишком долго, повторите позже.'
+    default_code = 'statement_timeout'
+
+
+def is_statement_timeout(exc):
+    """Запрос отменён PostgreSQL по statement_timeout."""
+    return isinstance(exc, OperationalError) and getattr(
+        exc.__cause__, 'pgcode', None
+    ) == QUERY_CANCELED
+
+
+class LazyStatementTimeout:
+    """
+    Обёртка execute_wrapper: выставляет statement_timeout соединения
+    перед первым запросом представления и сбрасывает его после ответа.
+
+    Представления, которые не обращаются к БД (ответ из кэша), не
+    открывают соединение и не выполняют лишних запросов.
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.applied = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if not self.applied:
+            self.applied = True
+            # Сырой курсор: SET не проходит через обёртки запросов.
+            context['cursor'].cursor.execute(
+                'SET statement_timeout = %s', (self.timeout,)
+            )
+        return execute(sql, params, many, context)
+
+    def reset(self):
+        if not self.applied:
+            return
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('RESET statement_timeout')
+        except DatabaseError:
+            # Лимит не должен остаться у соединения для следующих запросов.
+            connection.close()
+
+
+class StatementTimeoutMixin:
+    """
+    Ограничение времени SQL-запросов для действий набора представлений.
+
+    statement_timeouts сопоставляет действию область из
+    STATEMENT_TIMEOUTS, остальные действия получают 'default'. На
+    PostgreSQL лимит выставляется перед первым запросом представления,
+    без общей транзакции на запрос, отменённые запросы возвращают 503.
+    """
+
+    statement_timeouts = {}
+
+    def get_statement_timeout(self):
+        scope = self.statement_timeouts.get(
+            getattr(self, 'action', None), 'default'
+        )
+        return settings.STATEMENT_TIMEOUTS[scope]
+
+    def dispatch(self, request, *args, **kwargs):
+        timeout = self.get_statement_timeout()
+        if connection.vendor != 'postgresql' or not timeout:
+            return super().dispatch(request, *args, **kwargs)
+        wrapper = LazyStatementTimeout(timeout)
+        with connection.execute_wrapper(wrapper):
+            try:
+                return super().dispatch(request, *args, **kwargs)
+            finally:
+                wrapper.reset()
+
+    def handle_exception(self, exc):
+        if is_statement_timeout(exc):
+            exc = StatementTimeout()
+        return super().handle_exception(exc)
+
+
+class SlowQueryMiddleware:
+    """
+    Логирование SQL-запросов дольше SLOW_QUERY_MS миллисекунд.
+
+    В лог попадают время, представление, SQL и параметры запроса.
+    При SLOW_QUERY_MS = 0 middleware отключается.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERY_MS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(
+                    partial(self.log_slow, request)
+                ))
+            return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._view_name = view_name(view_func, request)
+
+    @staticmethod
+    def log_slow(request, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - started) * 1000
+            if duration >= settings.SLOW_QUERY_MS:
+                logger.warning(
+                    'Медленный запрос %.0f мс в %s: %s; параметры: %r',
+                    duration,
+                    getattr(request, '_view_name', request.path),
+                    sql,
+                    params,
+                )
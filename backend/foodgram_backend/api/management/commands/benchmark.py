@@ -0,0 +1,364 @@
+import http.client
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from api.aggregation import sum_by_ingredient
+from api.authentication import CachedTokenAuthentication, token_cache
+from api.recommendations import similarity_topk, sparse
+from api.renderers import ORJSONRenderer
+from api.serializers import IngredientSerializer
+from recipes.models import FoodgramUser, Ingredient, IngredientRecipe, Recipe
+
+
+def ingredient_payload():
+    """Полный список ингредиентов, как в IngredientViewSet.list."""
+    data = IngredientSerializer(Ingredient.objects.all(), many=True).data
+    if not data:
+        data = [
+            {'id': i, 'name': f'Ингредиент {i}', 'measurement_unit': 'г'}
+            for i in range(2188)
+        ]
+    return data
+
+
+def recipe_page_payload(size=100):
+    """Синтетическая страница рецептов по схеме ShowRecipeSerializer."""
+    author = {
+        'id': 1, 'username': 'cook', 'email': 'cook@example.com',
+        'first_name': 'Иван', 'last_name': 'Петров', 'is_subscribed': False,
+    }
+    return {
+        'count': size * 10,
+        'next': 'http://foodgram.example.org/api/recipes/?page=2',
+        'previous': None,
+        'results': [
+            {
+                'id': i,
+                'tags': [
+                    {'id': 1, 'name': 'Завтрак', 'color': '#E26C2D',
+                     'slug': 'breakfast'},
+                ],
+                'author': author,
+                'ingredients': [
+                    {'id': j, 'name': f'Ингредиент {j}',
+                     'measurement_unit': 'г', 'amount': j * 10}
+                    for j in range(1, 16)
+                ],
+                'name': f'Рецепт {i}',
+                'image': f'http://foodgram.example.org/media/{i}.jpg',
+                'text': 'Описание рецепта. ' * 20,
+                'cooking_time': 30,
+                'is_favorited': False,
+                'is_in_shopping_cart': False,
+            }
+            for i in range(size)
+        ],
+    }
+
+
+def bench_renderers(command, number, **options):
+    payloads = {
+        'ingredients': ingredient_payload(),
+        'recipe_page': recipe_page_payload(),
+    }
+    for name, data in payloads.items():
+        expected = JSONRenderer().render(data)
+        if ORJSONRenderer().render(data) != expected:
+            raise CommandError(f'{name}: вывод рендереров отличается.')
+        for renderer in (JSONRenderer(), ORJSONRenderer()):
+            seconds = timeit.timeit(
+                lambda: renderer.render(data), number=number
+            )
+            command.stdout.write(
+                f'{name:<12} {type(renderer).__name__:<15} '
+                f'{number / seconds:10.1f} ops/s '
+                f'{len(expected) * number / seconds / 2**20:8.1f} MiB/s'
+            )
+
+
+def bench_auth(command, number, **options):
+    token = Token.objects.select_related('user').first()
+    if token is None:
+        raise CommandError('Нет ни одного токена для замера.')
+    request = APIRequestFactory().get(
+        '/api/recipes/', HTTP_AUTHORIZATION=f'Token {token.key}'
+    )
+    token_cache.clear()
+    for authentication in (TokenAuthentication(), CachedTokenAuthentication()):
+        authentication.authenticate(request)
+        with CaptureQueriesContext(connection) as queries:
+            seconds = timeit.timeit(
+                lambda: authentication.authenticate(request), number=number
+            )
+        command.stdout.write(
+            f'{type(authentication).__name__:<26} '
+            f'{len(queries) / number:4.1f} запросов/запрос '
+            f'{seconds / number * 10**6:10.1f} мкс/запрос'
+        )
+
+
+def create_recipes(size, ingredients_per_recipe=10):
+    """Создаёт синтетические рецепты; вызывать внутри транзакции."""
+    ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+    if len(ingredient_ids) < ingredients_per_recipe:
+        raise CommandError('Сначала загрузите ингредиенты: load_data.')
+    author = FoodgramUser.objects.create(
+        username='benchmark', email='benchmark@example.com'
+    )
+    recipes = Recipe.objects.bulk_create(
+        Recipe(
+            author=author, name=f'benchmark-{i}', image='benchmark.jpg',
+            text='benchmark', cooking_time=1
+        )
+        for i in range(size)
+    )
+    IngredientRecipe.objects.bulk_create(
+        IngredientRecipe(
+            recipe=recipe, ingredient_id=ingredient_id,
+            amount=random.randint(1, 1000)
+        )
+        for recipe in recipes
+        for ingredient_id in random.sample(
+            ingredient_ids, ingredients_per_recipe
+        )
+    )
+    return [recipe.pk for recipe in recipes]
+
+
+def bench_aggregation(command, number, size, **options):
+    with transaction.atomic():
+        recipe_ids = create_recipes(size)
+
+        def orm_sum(recipe_ids):
+            return {
+                row['ingredient']: row['amount']
+                for row in IngredientRecipe.objects.filter(
+                    recipe__in=recipe_ids
+                ).values('ingredient').annotate(amount=Sum('amount'))
+            }
+
+        if orm_sum(recipe_ids) != sum_by_ingredient(recipe_ids):
+            raise CommandError('Результаты агрегации отличаются.')
+        for name, func in (
+            ('ORM Sum', orm_sum), ('sum_by_ingredient', sum_by_ingredient)
+        ):
+            seconds = timeit.timeit(
+                lambda: func(recipe_ids), number=number
+            )
+            command.stdout.write(
+                f'{size} рецептов {name:<18} '
+                f'{seconds / number * 1000:8.2f} мс/вызов'
+            )
+        transaction.set_rollback(True)
+
+
+def bench_recommendations(command, recipes, favorites, **options):
+    if sparse is None:
+        raise CommandError('Для сценария нужен scipy.')
+    rng = np.random.default_rng(0)
+    users = favorites // 20
+    # Популярность рецептов распределена по степенному закону.
+    popularity = rng.zipf(1.5, favorites) % recipes
+    interactions = sparse.coo_matrix(
+        (
+            np.ones(favorites, dtype=np.float32),
+            (popularity, rng.integers(0, users, favorites)),
+        ),
+        shape=(recipes, users),
+    ).tocsr()
+    ingredients = sparse.coo_matrix(
+        (
+            np.ones(recipes * 10, dtype=np.float32),
+            (
+                np.repeat(np.arange(recipes), 10),
+                rng.integers(0, 2188, recipes * 10),
+            ),
+        ),
+        shape=(recipes, 2188),
+    ).tocsr()
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    rows, _, _ = similarity_topk(interactions, ingredients)
+    seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    command.stdout.write(
+        f'{recipes} рецептов, {favorites} добавлений: {len(rows)} пар '
+        f'за {seconds:.1f} с, пик памяти {peak / 2**20:.0f} МиБ'
+    )
+
+
+GUNICORN_CONFIGS = (
+    {'GUNICORN_WORKER_CLASS': 'sync', 'GUNICORN_WORKERS': '1',
+     'GUNICORN_PRELOAD': 'False'},
+    {'GUNICORN_WORKER_CLASS': 'gthread', 'GUNICORN_THREADS': '1'},
+    {'GUNICORN_WORKER_CLASS': 'gthread', 'GUNICORN_THREADS': '4'},
+    {'GUNICORN_WORKER_CLASS': 'gthread', 'GUNICORN_THREADS': '4',
+     'GUNICORN_PRELOAD': 'False'},
+    {'GUNICORN_WORKER_CLASS': 'gevent'},
+)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_server(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+        except OSError:
+            time.sleep(0.2)
+        else:
+            return True
+    return False
+
+
+def fetch_many(port, path, count):
+    """Выполняет count запросов по одному keep-alive соединению."""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    latencies, errors = [], 0
+    for _ in range(count):
+        started = time.perf_counter()
+        try:
+            connection.request('GET', path, headers={'Host': 'localhost'})
+            response = connection.getresponse()
+            response.read()
+        except (http.client.HTTPException, OSError):
+            errors += 1
+            connection.close()
+            continue
+        latencies.append(time.perf_counter() - started)
+        if response.status != 200:
+            errors += 1
+        if response.will_close:
+            connection.close()
+    connection.close()
+    return latencies, errors
+
+
+def bench_gunicorn(command, number, concurrency, path, **options):
+    for config in GUNICORN_CONFIGS:
+        if config['GUNICORN_WORKER_CLASS'] == 'gevent':
+            try:
+                import gevent  # noqa: F401
+            except ImportError:
+                command.stdout.write('gevent не установлен, пропуск.')
+                continue
+        port = free_port()
+        env = {
+            **os.environ,
+            **config,
+            'GUNICORN_BIND': f'127.0.0.1:{port}',
+            'GUNICORN_ACCESSLOG': '',
+            'GUNICORN_MAX_REQUESTS': '0',
+            'THROTTLE_ANON': f'{number * 10}/min',
+            'THROTTLE_USER': f'{number * 10}/min',
+            'DJANGO_SETTINGS_MODULE': 'foodgram_backend.settings_api',
+        }
+        process = subprocess.Popen(
+            (sys.executable, '-m', 'gunicorn', '--config',
+             'gunicorn.conf.py', 'foodgram_backend.wsgi'),
+            cwd=settings.BASE_DIR, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            if not wait_for_server(port, process):
+                raise CommandError(f'gunicorn не запустился: {config}')
+            fetch_many(port, path, concurrency)
+            started = time.perf_counter()
+            with ThreadPoolExecutor(concurrency) as executor:
+                results = list(executor.map(
+                    lambda count: fetch_many(port, path, count),
+                    [number // concurrency] * concurrency,
+                ))
+            seconds = time.perf_counter() - started
+        finally:
+            process.terminate()
+            process.wait()
+        latencies = sorted(
+            latency for batch, _ in results for latency in batch
+        )
+        errors = sum(batch_errors for _, batch_errors in results)
+        quantiles = statistics.quantiles(latencies, n=20)
+        name = ' '.join(
+            f'{key[len("GUNICORN_"):].lower()}={value}'
+            for key, value in config.items()
+        )
+        command.stdout.write(
+            f'{name:<45} {len(latencies) / seconds:8.1f} req/s '
+            f'p50 {quantiles[9] * 1000:6.1f} мс '
+            f'p95 {quantiles[18] * 1000:6.1f} мс ошибок {errors}'
+        )
+
+
+SCENARIOS = {
+    'renderers': bench_renderers,
+    'auth': bench_auth,
+    'aggregation': bench_aggregation,
+    'recommendations': bench_recommendations,
+    'gunicorn': bench_gunicorn,
+}
+
+
+class Command(BaseCommand):
+    """Команда для замера производительности компонентов API."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'scenario', nargs='?', choices=SCENARIOS, default=None
+        )
+        parser.add_argument('--number', type=int, default=100)
+        parser.add_argument(
+            '--size', type=int, default=2000,
+            help='Количество синтетических рецептов.'
+        )
+        parser.add_argument(
+            '--recipes', type=int, default=100_000,
+            help='Количество рецептов в сценарии recommendations.'
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=1_000_000,
+            help='Количество добавлений в сценарии recommendations.'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=16,
+            help='Параллельные клиенты в сценарии gunicorn.'
+        )
+        parser.add_argument(
+            '--path', default='/api/recipes/',
+            help='Адрес для нагрузки в сценарии gunicorn.'
+        )
+
+    def handle(self, *args, **options):
+        scenarios = (
+            (options['scenario'],) if options['scenario'] else SCENARIOS
+        )
+        for name in scenarios:
+            self.stdout.write(f'Сценарий {name}:')
+            SCENARIOS[name](self, **options)
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.recommendations import build_index
+from recipes.constants import SIMILAR_RECIPES_LIMIT
+
+
+class Command(BaseCommand):
+    """Команда для пересчёта индекса похожих рецептов."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--k', type=int, default=SIMILAR_RECIPES_LIMIT)
+        parser.add_argument(
+            '--alpha', type=float, default=0.7,
+            help='Вес совместных добавлений относительно ингредиентов.'
+        )
+        parser.add_argument(
+            '--max-df', type=float, default=0.01,
+            help='Пропускать ингредиенты, которые есть в большей доле '
+                 'рецептов.'
+        )
+        parser.add_argument('--block-size', type=int, default=512)
+
+    def handle(self, *args, **options):
+        self.stdout.write('Началось построение индекса рекомендаций.')
+        started = time.perf_counter()
+        try:
+            pairs = build_index(
+                k=options['k'],
+                alpha=options['alpha'],
+                max_df=options['max_df'],
+                block_size=options['block_size'],
+            )
+        except ImportError as error:
+            raise CommandError(str(error))
+        self.stdout.write(
+            f'Записано пар: {pairs} за '
+            f'{time.perf_counter() - started:.1f} с.'
+        )
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import QueuedTask
+
+
+class Command(BaseCommand):
+    """Команда для удаления завершённых фоновых задач."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7)
+        parser.add_argument(
+            '--failed', action='store_true',
+            help='Удалять и задачи, завершившиеся ошибкой.'
+        )
+
+    def handle(self, *args, **options):
+        statuses = [QueuedTask.Status.DONE]
+        if options['failed']:
+            statuses.append(QueuedTask.Status.FAILED)
+        deleted, _ = QueuedTask.objects.filter(
+            status__in=statuses,
+            created__lt=timezone.now() - timedelta(days=options['days']),
+        ).delete()
+        self.stdout.write(f'Удалено задач: {deleted}.')
@@ -0,0 +1,90 @@
+import json
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.importing import import_recipes
+from recipes.constants import IMPORT_BATCH_SIZE
+from recipes.models import FoodgramUser
+
+
+class Command(BaseCommand):
+    """
+    Команда для массового импорта рецептов из файла JSON Lines.
+
+    Каждая строка файла - рецепт в формате API с изображением в base64.
+    Файл читается частями по --chunk строк, ошибки выводятся с номером
+    строки.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--author', required=True, help='Email автора рецептов.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+            help='Рецептов в одной транзакции.'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=settings.IMPORT_WORKERS,
+            help='Потоков для декодирования изображений.'
+        )
+        parser.add_argument(
+            '--chunk', type=int, default=5000,
+            help='Строк файла, проверяемых вместе.'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            author = FoodgramUser.objects.get(email=options['author'])
+        except FoodgramUser.DoesNotExist:
+            raise CommandError(
+                f'Пользователь {options["author"]} не найден.'
+            )
+        started = time.perf_counter()
+        created = failed = 0
+        try:
+            with open(options['path'], encoding='utf-8') as file:
+                lines = enumerate(file, start=1)
+                while chunk := list(islice(lines, options['chunk'])):
+                    numbers, records = [], []
+                    for number, line in chunk:
+                        if not line.strip():
+                            continue
+                        try:
+                            records.append(json.loads(line))
+                        except json.JSONDecodeError as error:
+                            failed += 1
+                            self.stderr.write(f'Строка {number}: {error}')
+                            continue
+                        numbers.append(number)
+                    report = import_recipes(
+                        records, author,
+                        batch_size=options['batch_size'],
+                        workers=options['workers'],
+                    )
+                    created += report['created']
+                    failed += report['failed']
+                    for result in report['results']:
+                        if 'errors' in result:
+                            errors = json.dumps(
+                                result['errors'], ensure_ascii=False
+                            )
+                            self.stderr.write(
+                                f'Строка {numbers[result["index"]]}: {errors}'
+                            )
+                    self.stdout.write(
+                        f'Строк обработано: {chunk[-1][0]}, '
+                        f'создано рецептов: {created}.'
+                    )
+        except FileNotFoundError:
+            raise CommandError(f'Файл {options["path"]} не найден.')
+
+        seconds = time.perf_counter() - started
+        self.stdout.write(
+            f'Создано: {created}, с ошибками: {failed} за {seconds:.1f} с '
+            f'({created / seconds:.0f} рецептов/с).'
+        )
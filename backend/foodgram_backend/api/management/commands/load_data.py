@@ -1,6 +1,7 @@
 import csv
 
 from django.core.management.base import BaseCommand
+from django.db import transaction
 
 from recipes.models import Tag, Ingredient
 
@@ -19,7 +20,11 @@ class Command(BaseCommand):
             model_name = model.__name__
             self.stdout.write(f'Началась загрузка модели {model_name}.')
             try:
-                with open(data[model], encoding='utf-8') as file:
+                # Одна транзакция: сигналы справочника срабатывают
+                # после фиксации один раз, а не на каждую строку.
+                with open(
+                    data[model], encoding='utf-8'
+                ) as file, transaction.atomic():
                     for row in csv.reader(file):
                         if model == Tag:
                             name, color, slug = row
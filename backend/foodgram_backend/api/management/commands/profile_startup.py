@@ -0,0 +1,92 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Выполняется в отдельном процессе: холодный старт нельзя замерить
+# в уже настроенном интерпретаторе.
+PROBE = '''
+import json, sys, time, timeit
+started = time.perf_counter()
+import django
+django.setup()
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.test import RequestFactory
+settings.DEBUG = False
+handler = WSGIHandler()
+host = settings.ALLOWED_HOSTS[0].lstrip('.')
+request = RequestFactory().get(
+    '/api/__probe__/', HTTP_HOST='localhost' if host == '*' else host
+)
+handler.get_response(request)
+setup = time.perf_counter() - started
+number = int(sys.argv[1])
+seconds = timeit.timeit(lambda: handler.get_response(request), number=number)
+print(json.dumps({
+    'setup': setup,
+    'request': seconds / number,
+    'apps': len(settings.INSTALLED_APPS),
+    'middleware': len(settings.MIDDLEWARE),
+}))
+'''
+
+
+def parse_importtime(stderr):
+    """Разбирает вывод -X importtime: {модуль: накопленное время, мкс}."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative)
+    return modules
+
+
+class Command(BaseCommand):
+    """Команда для замера времени импорта и холодного старта Django."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'profiles', nargs='*',
+            default=('foodgram_backend.settings',
+                     'foodgram_backend.settings_api'),
+            help='Модули настроек для сравнения.'
+        )
+        parser.add_argument('--top', type=int, default=15)
+        parser.add_argument(
+            '--number', type=int, default=1000,
+            help='Количество запросов для замера middleware.'
+        )
+
+    def handle(self, *args, **options):
+        for profile in options['profiles']:
+            result = subprocess.run(
+                (sys.executable, '-X', 'importtime', '-c', PROBE,
+                 str(options['number'])),
+                capture_output=True,
+                text=True,
+                cwd=settings.BASE_DIR,
+                env={**os.environ, 'DJANGO_SETTINGS_MODULE': profile},
+            )
+            if result.returncode:
+                raise CommandError(f'{profile}:\n{result.stderr[-2000:]}')
+            stats = json.loads(result.stdout.splitlines()[-1])
+            modules = parse_importtime(result.stderr)
+            self.stdout.write(
+                f'{profile}: приложений {stats["apps"]}, '
+                f'middleware {stats["middleware"]}, модулей {len(modules)}, '
+                f'запуск {stats["setup"] * 1000:.0f} мс, '
+                f'запрос {stats["request"] * 10**6:.0f} мкс'
+            )
+            top_level = {
+                name: cumulative for name, cumulative in modules.items()
+                if '.' not in name
+            }
+            for name, cumulative in sorted(
+                top_level.items(), key=lambda item: -item[1]
+            )[:options['top']]:
+                self.stdout.write(f'  {cumulative / 1000:8.1f} мс  {name}')
@@ -0,0 +1,58 @@
+import io
+import pstats
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.profiling import matches
+
+
+class Command(BaseCommand):
+    """Команда для сводки профилей, собранных ProfilingMiddleware."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'views', nargs='*',
+            help='Представления, например RecipeViewSet.list; '
+                 'по умолчанию все.'
+        )
+        parser.add_argument('--dir', default=settings.PROFILING_DIR)
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument(
+            '--sort', default='cumulative',
+            choices=('cumulative', 'tottime', 'ncalls'),
+        )
+        parser.add_argument(
+            '--output', help='Сохранить объединённый профиль в файл.'
+        )
+
+    def handle(self, *args, **options):
+        directory = Path(options['dir'])
+        samples = {
+            path.name: sorted(path.glob('*.prof'))
+            for path in sorted(directory.glob('*'))
+            if path.is_dir() and matches(path.name, options['views'])
+        }
+        files = [file for paths in samples.values() for file in paths]
+        if not files:
+            raise CommandError(f'Нет профилей в {directory}.')
+
+        for name, paths in samples.items():
+            self.stdout.write(f'{name}: {len(paths)} запросов')
+        # OutputWrapper добавляет перевод строки к каждому write,
+        # поэтому отчёт pstats собирается в буфер.
+        report = io.StringIO()
+        stats = pstats.Stats(*map(str, files), stream=report)
+        if options['output']:
+            stats.dump_stats(options['output'])
+        self.stdout.write(
+            f'Всего {len(files)} запросов, '
+            f'{stats.total_tt / len(files) * 1000:.1f} мс в среднем.'
+        )
+        # Не печатать в заголовке имена всех файлов выборки.
+        stats.files = []
+        stats.strip_dirs().sort_stats(options['sort']).print_stats(
+            options['top']
+        )
+        self.stdout.write(report.getvalue())
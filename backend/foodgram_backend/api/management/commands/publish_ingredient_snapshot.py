@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.snapshots import publish_snapshot
+
+
+class Command(BaseCommand):
+    """Команда для записи снимка справочника ингредиентов."""
+
+    def handle(self, *args, **options):
+        manifest = publish_snapshot()
+        self.stdout.write(
+            f'Снимок {manifest["url"]}: ингредиентов {manifest["count"]}, '
+            f'{manifest["size"] / 1024:.1f} КБ.'
+        )
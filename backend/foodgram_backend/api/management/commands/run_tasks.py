@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.queue import DatabaseBackend
+
+
+class Command(BaseCommand):
+    """Воркер фоновой очереди DatabaseBackend."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить готовые задачи и выйти.'
+        )
+        parser.add_argument('--batch', type=int, default=50)
+        parser.add_argument(
+            '--sleep', type=float, default=1,
+            help='Пауза между опросами пустой очереди, сек.'
+        )
+        parser.add_argument(
+            '--stale-timeout', type=int, default=600,
+            help='Через сколько секунд считать задачу зависшей.'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Воркер очереди запущен.')
+        try:
+            while True:
+                DatabaseBackend.requeue_stale(options['stale_timeout'])
+                processed = DatabaseBackend.run_pending(options['batch'])
+                if processed:
+                    self.stdout.write(f'Выполнено задач: {processed}.')
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write('Воркер очереди остановлен.')
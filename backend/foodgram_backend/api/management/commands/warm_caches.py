@@ -0,0 +1,165 @@
+import re
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+
+from api.throttling import INTERNAL_REQUEST
+from recipes.models import Recipe, Tag
+
+CATALOG_PATHS = ('/api/tags/', '/api/ingredients/')
+ACCESS_LOG_RE = re.compile(
+    r'"GET (/api/(?:recipes|tags|ingredients)/\S*) HTTP/[\d.]+" (?:200|304) '
+)
+
+
+def default_paths(pages, limit, recipes):
+    """
+    Справочники, первые страницы списка рецептов без тегов, с каждым
+    тегом и со всеми тегами (так список открывает фронтенд) и страницы
+    последних рецептов.
+    """
+    slugs = list(Tag.objects.values_list('slug', flat=True))
+    combinations = [[], *([slug] for slug in slugs)]
+    if len(slugs) > 1:
+        combinations.append(slugs)
+    paths = list(CATALOG_PATHS)
+    for tags in combinations:
+        query = ''.join(f'&tags={slug}' for slug in tags)
+        paths.extend(
+            f'/api/recipes/?page={page}&limit={limit}{query}'
+            for page in range(1, pages + 1)
+        )
+    paths.extend(
+        f'/api/recipes/{pk}/'
+        for pk in Recipe.objects.values_list('pk', flat=True)[:recipes]
+    )
+    return paths
+
+
+def access_log_paths(path, top):
+    """Самые частые успешные GET-запросы к API из лога nginx."""
+    counter = Counter()
+    with open(path, encoding='utf-8', errors='replace') as file:
+        for line in file:
+            match = ACCESS_LOG_RE.search(line)
+            if match:
+                counter[match.group(1)] += 1
+    return [path for path, _ in counter.most_common(top)]
+
+
+class Command(BaseCommand):
+    """
+    Команда для прогрева кэшей после деплоя.
+
+    Анонимные запросы к справочникам и популярным вариантам списка
+    рецептов выполняются тестовым клиентом в пуле потоков, каждый
+    адрес запрашивается дважды: холодный и повторный запрос. Лимиты
+    запросов на прогрев не действуют. Ответы 4xx (например, пустые
+    страницы списка) выводятся в отчёте, 5xx завершают команду ошибкой.
+    Без общего кэша прогрев пропускается, если не указан --force.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='*', help='Дополнительные адреса для прогрева.'
+        )
+        parser.add_argument(
+            '--access-log',
+            help='Лог nginx: прогреть самые частые запросы из него.'
+        )
+        parser.add_argument('--top', type=int, default=200)
+        parser.add_argument('--pages', type=int, default=3)
+        parser.add_argument(
+            '--limit', type=int, default=settings.REST_FRAMEWORK['PAGE_SIZE']
+        )
+        parser.add_argument(
+            '--recipes', type=int, default=20,
+            help='Сколько последних рецептов прогреть.'
+        )
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument(
+            '--host',
+            default=next(
+                (host for host in settings.ALLOWED_HOSTS
+                 if host != '*' and not host.startswith('.')),
+                'testserver'
+            ),
+            help='Host, под которым сайт доступен снаружи: от него '
+                 'зависят ссылки на изображения в кэше.'
+        )
+        parser.add_argument('--secure', action='store_true')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Прогреть и без общего кэша: только эту команду и БД.'
+        )
+
+    def handle(self, *args, **options):
+        if not (settings.CACHE_SHARED and settings.RESPONSE_CACHE):
+            message = (
+                'Кэш ответов выключен или локален для процесса: прогрев не '
+                'дойдёт до воркеров gunicorn. Задайте общий CACHE_BACKEND.'
+            )
+            if not options['force']:
+                self.stderr.write(f'{message} Прогрев пропущен.')
+                return
+            self.stderr.write(message)
+        if options['access_log']:
+            try:
+                paths = access_log_paths(
+                    options['access_log'], options['top']
+                )
+            except FileNotFoundError:
+                raise CommandError(
+                    f'Файл {options["access_log"]} не найден.'
+                )
+        else:
+            paths = default_paths(
+                options['pages'], options['limit'], options['recipes']
+            )
+        paths = list(dict.fromkeys([*paths, *options['path']]))
+
+        environ = {
+            'HTTP_HOST': options['host'],
+            'HTTP_ACCEPT_ENCODING': 'br, gzip',
+            INTERNAL_REQUEST: True,
+        }
+
+        def warm(path):
+            client = Client(raise_request_exception=False, **environ)
+            timings = []
+            try:
+                for _ in range(2):
+                    started = time.perf_counter()
+                    response = client.get(path, secure=options['secure'])
+                    timings.append((time.perf_counter() - started) * 1000)
+            finally:
+                connections.close_all()
+            return path, response.status_code, *timings
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            results = list(pool.map(warm, paths))
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(f'{"код":>4} {"холодный":>9} {"повторный":>9}')
+        for path, status, cold, repeat in sorted(
+            results, key=lambda result: -result[2]
+        ):
+            self.stdout.write(
+                f'{status:>4} {cold:>7.1f}мс {repeat:>7.1f}мс  {path}'
+            )
+        warmed = sum(result[1] == 200 for result in results)
+        failed = [result for result in results if result[1] >= 500]
+        self.stdout.write(
+            f'Прогрето адресов: {warmed} из '
+            f'{len(results)} за {elapsed:.1f} с, холодные запросы '
+            f'{sum(result[2] for result in results) / 1000:.1f} с, '
+            f'повторные {sum(result[3] for result in results) / 1000:.1f} с.'
+        )
+        if failed:
+            raise CommandError(f'Адресов с ошибкой: {len(failed)}.')
@@ -0,0 +1,158 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import (LimitOffsetPagination,
+                                       PageNumberPagination)
+
+from recipes.constants import MAX_PAGE_LIMIT
+
+COUNT_KEY = 'count:{}'
+
+
+def planner_estimate(queryset):
+    """Оценка числа строк планировщиком PostgreSQL."""
+    connection = connections[queryset.db]
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def approximate_count(queryset):
+    """
+    Число записей queryset и признак того, что оно приблизительное.
+
+    Большие выборки (от APPROXIMATE_COUNT_THRESHOLD) на PostgreSQL
+    оцениваются планировщиком, на остальных СУБД точный COUNT
+    кэшируется на COUNT_CACHE_TIMEOUT секунд. Небольшие выборки
+    всегда считаются точно.
+    """
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return 0, False
+    key = COUNT_KEY.format(
+        hashlib.md5(repr((queryset.db, sql, params)).encode()).hexdigest()
+    )
+    count = cache.get(key)
+    if count is not None:
+        return count, True
+
+    threshold = settings.APPROXIMATE_COUNT_THRESHOLD
+    if connections[queryset.db].vendor == 'postgresql':
+        estimate = planner_estimate(queryset)
+        if estimate >= threshold:
+            return estimate, True
+
+    count = queryset.count()
+    if count >= threshold:
+        cache.set(key, count, settings.COUNT_CACHE_TIMEOUT)
+    return count, False
+
+
+def mark_approximate(response, approximate):
+    """Добавляет в ответ признак приблизительного count после count."""
+    data = response.data
+    response.data = {
+        'count': data.pop('count'),
+        'count_is_approximate': approximate,
+        **data,
+    }
+    return response
+
+
+class ApproximatePage(Page):
+
+    def has_next(self):
+        if self.paginator.approximate:
+            return len(self.object_list) == self.paginator.per_page
+        return super().has_next()
+
+
+class ApproximatePaginator(Paginator):
+    """
+    Paginator с приблизительным подсчётом для больших выборок.
+
+    Приблизительный count может быть меньше настоящего, поэтому
+    страница за его пределами отклоняется, только если она пуста.
+    """
+
+    approximate = False
+
+    @cached_property
+    def count(self):
+        count, self.approximate = approximate_count(self.object_list)
+        return count
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            number = int(number)
+            if not self.approximate or number < 1:
+                raise
+            bottom = (number - 1) * self.per_page
+            if not self.object_list[bottom:bottom + 1].exists():
+                raise
+            return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.approximate:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(
+            self.object_list[bottom:bottom + self.per_page], number, self
+        )
+
+    def _get_page(self, *args, **kwargs):
+        return ApproximatePage(*args, **kwargs)
+
+
+class RecipePagination(PageNumberPagination):
+    """Постраничная пагинация с признаком приблизительного count."""
+
+    django_paginator_class = ApproximatePaginator
+
+    def get_paginated_response(self, data):
+        return mark_approximate(
+            super().get_paginated_response(data),
+            self.page.paginator.approximate
+        )
+
+
+class BoundedLimitOffsetPagination(LimitOffsetPagination):
+    """Пагинация limit/offset с ограничением размера страницы."""
+
+    max_limit = MAX_PAGE_LIMIT
+    approximate = False
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            limit = None
+        if limit is not None and limit > self.max_limit:
+            raise ValidationError(
+                {self.limit_query_param: f'Не больше {self.max_limit}'}
+            )
+        return super().get_limit(request)
+
+    def get_count(self, queryset):
+        count, self.approximate = approximate_count(queryset)
+        return count
+
+    def get_paginated_response(self, data):
+        return mark_approximate(
+            super().get_paginated_response(data), self.approximate
+        )
@@ -0,0 +1,83 @@
+import cProfile
+import os
+import random
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+
+
+def view_name(view_func, request):
+    """Имя вида 'RecipeViewSet.list' для представлений DRF."""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return view_func.__name__
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f'{cls.__name__}.{action}'
+
+
+def matches(name, patterns):
+    """Пустой список - все представления, 'RecipeViewSet' - все действия."""
+    return not patterns or any(
+        name == pattern or name.startswith(f'{pattern}.')
+        for pattern in patterns
+    )
+
+
+class ProfilingMiddleware:
+    """
+    Выборочное профилирование запросов через cProfile.
+
+    Запрос профилируется, если его представление подходит под
+    PROFILING_VIEWS и он попал в выборку PROFILING_SAMPLE_RATE, либо
+    если заголовок X-Profile совпадает с PROFILING_TOKEN. Профиль
+    сохраняется в формате pstats в PROFILING_DIR/<представление>/.
+    В процессе одновременно профилируется не больше одного запроса.
+    """
+
+    def __init__(self, get_response):
+        if not (settings.PROFILING_ENABLED or settings.PROFILING_TOKEN):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        profile = getattr(request, '_profile', None)
+        if profile is not None:
+            profile.disable()
+            self.lock.release()
+            response['X-Profile-Id'] = self.save(
+                profile, request._profile_name
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        name = view_name(view_func, request)
+        forced = bool(settings.PROFILING_TOKEN) and request.META.get(
+            PROFILE_HEADER
+        ) == settings.PROFILING_TOKEN
+        sampled = (
+            settings.PROFILING_ENABLED
+            and matches(name, settings.PROFILING_VIEWS)
+            and random.random() < settings.PROFILING_SAMPLE_RATE
+        )
+        if not (forced or sampled) or not self.lock.acquire(blocking=False):
+            return None
+        request._profile = cProfile.Profile()
+        request._profile_name = name
+        request._profile.enable()
+        return None
+
+    @staticmethod
+    def save(profile, name):
+        directory = Path(settings.PROFILING_DIR) / name
+        directory.mkdir(parents=True, exist_ok=True)
+        profile_id = f'{time.time_ns()}-{os.getpid()}'
+        profile.dump_stats(directory / f'{profile_id}.prof')
+        return profile_id
@@ -0,0 +1,165 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import QueuedTask
+
+logger = logging.getLogger(__name__)
+
+
+class Task:
+    """Функция, которую можно выполнить в фоне через task.delay()."""
+
+    def __init__(self, func):
+        self.func = func
+        self.name = f'{func.__module__}.{func.__name__}'
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        """Ставит задачу в очередь после фиксации текущей транзакции."""
+        self.delay_in(0, *args, **kwargs)
+
+    def delay_in(self, countdown, *args, **kwargs):
+        """Как delay, но задача выполнится не раньше чем через countdown с."""
+        transaction.on_commit(
+            lambda: get_backend().enqueue(self.name, args, kwargs, countdown)
+        )
+
+    def delay_cached(self, *args, **kwargs):
+        """
+        delay для задач, которые сбрасывают кэш Django.
+
+        В отдельный процесс (DatabaseBackend) такая задача уходит только
+        при общем кэше: иначе она сбросит кэш воркера задач, а не API.
+        С локальным кэшем задача выполняется после фиксации транзакции
+        в текущем процессе.
+        """
+        if settings.CACHE_SHARED or get_backend().in_process:
+            self.delay(*args, **kwargs)
+        else:
+            transaction.on_commit(lambda: self(*args, **kwargs))
+
+
+def task(func):
+    return Task(func)
+
+
+def execute(name, args, kwargs):
+    """Выполняет задачу по имени."""
+    import_string(name)(*args, **kwargs)
+
+
+class ImmediateBackend:
+    """Выполняет задачи сразу, в потоке запроса, без учёта countdown."""
+
+    in_process = True
+
+    def enqueue(self, name, args, kwargs, countdown=0):
+        execute(name, args, kwargs)
+
+
+class ThreadPoolBackend:
+    """Пул потоков внутри процесса: для локальной разработки."""
+
+    in_process = True
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.TASKS_WORKERS,
+            thread_name_prefix='foodgram-task',
+        )
+
+    def enqueue(self, name, args, kwargs, countdown=0):
+        if not countdown:
+            self.executor.submit(self.run, name, args, kwargs)
+            return
+        timer = threading.Timer(
+            countdown, self.executor.submit, (self.run, name, args, kwargs)
+        )
+        timer.daemon = True
+        timer.start()
+
+    @staticmethod
+    def run(name, args, kwargs):
+        close_old_connections()
+        try:
+            execute(name, args, kwargs)
+        except Exception:
+            logger.exception('Задача %s завершилась с ошибкой', name)
+        finally:
+            close_old_connections()
+
+
+class DatabaseBackend:
+    """Очередь в таблице QueuedTask, её разбирает команда run_tasks."""
+
+    in_process = False
+
+    def enqueue(self, name, args, kwargs, countdown=0):
+        QueuedTask.objects.create(
+            name=name, args=list(args), kwargs=kwargs,
+            run_at=timezone.now() + timedelta(seconds=countdown),
+        )
+
+    @staticmethod
+    def requeue_stale(timeout):
+        """Возвращает в очередь задачи упавших воркеров."""
+        return QueuedTask.objects.filter(
+            status=QueuedTask.Status.RUNNING,
+            started_at__lt=timezone.now() - timedelta(seconds=timeout),
+        ).update(status=QueuedTask.Status.PENDING)
+
+    @staticmethod
+    def run_pending(batch):
+        """
+        Выполняет до batch готовых задач.
+
+        Задача захватывается условным UPDATE, поэтому несколько воркеров
+        не выполнят одну и ту же задачу дважды. Возвращает число
+        обработанных задач.
+        """
+        Status = QueuedTask.Status
+        pending = QueuedTask.objects.filter(
+            status=Status.PENDING, run_at__lte=timezone.now()
+        ).order_by('run_at', 'id').values_list('id', flat=True)[:batch]
+        processed = 0
+        for pk in list(pending):
+            claimed = QueuedTask.objects.filter(
+                pk=pk, status=Status.PENDING
+            ).update(status=Status.RUNNING, started_at=timezone.now())
+            if not claimed:
+                continue
+            queued = QueuedTask.objects.get(pk=pk)
+            queued.attempts += 1
+            try:
+                execute(queued.name, queued.args, queued.kwargs)
+            except Exception as error:
+                logger.exception('Задача %s завершилась с ошибкой', pk)
+                queued.error = repr(error)
+                if queued.attempts < settings.TASKS_MAX_ATTEMPTS:
+                    queued.status = Status.PENDING
+                    queued.run_at = timezone.now() + timedelta(
+                        seconds=2 ** queued.attempts
+                    )
+                else:
+                    queued.status = Status.FAILED
+            else:
+                queued.status = Status.DONE
+            queued.save()
+            processed += 1
+        return processed
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    return import_string(settings.TASKS_BACKEND)()
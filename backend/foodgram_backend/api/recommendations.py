@@ -0,0 +1,156 @@
+import numpy as np
+from django.db import transaction
+
+from recipes.constants import SIMILAR_RECIPES_LIMIT
+from recipes.models import (Favorites, IngredientRecipe, Recipe,
+                            ShoppingList, SimilarRecipe)
+
+try:
+    from scipy import sparse
+except ImportError:
+    sparse = None
+
+FAVORITE_WEIGHT = 1.0
+SHOPPING_LIST_WEIGHT = 0.5
+# Ингредиенты отсекаются по max_df, только если встречаются больше чем
+# в MAX_DF_FLOOR рецептах: на небольшой базе иначе отсекается всё общее.
+MAX_DF_FLOOR = 50
+
+
+def normalize_rows(matrix):
+    """Нормирует строки разреженной матрицы для косинусного сходства."""
+    norms = np.sqrt(
+        np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel()
+    )
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms) @ matrix
+
+
+def similarity_topk(interactions, ingredients, k=SIMILAR_RECIPES_LIMIT,
+                    alpha=0.7, max_df=0.01, block_size=512):
+    """
+    Находит k ближайших соседей каждого рецепта.
+
+    interactions - матрица рецепт x пользователь (избранное и корзина),
+    ingredients - матрица рецепт x ингредиент. Сходство - взвешенная
+    сумма косинусов по совместным добавлениям и по ингредиентам с весами
+    IDF; ингредиенты, встречающиеся больше чем в max_df доле рецептов
+    (и больше чем в MAX_DF_FLOOR), не учитываются. Произведения
+    считаются блоками по block_size строк, так что память ограничена
+    размером блока. Возвращает массивы (строки, соседи, оценки).
+    """
+    n_recipes = interactions.shape[0]
+    behaviour = normalize_rows(interactions.astype(np.float32).tocsr())
+
+    df = np.bincount(ingredients.indices, minlength=ingredients.shape[1])
+    idf = np.log(n_recipes / np.maximum(df, 1))
+    idf[df > max(max_df * n_recipes, MAX_DF_FLOOR)] = 0
+    content = normalize_rows(
+        ingredients.astype(np.float32).tocsr()
+        @ sparse.diags(idf.astype(np.float32))
+    )
+    behaviour_t = behaviour.T.tocsr()
+    content_t = content.T.tocsr()
+
+    rows, cols, scores = [], [], []
+    for start in range(0, n_recipes, block_size):
+        stop = min(start + block_size, n_recipes)
+        block = (
+            alpha * (behaviour[start:stop] @ behaviour_t)
+            + (1 - alpha) * (content[start:stop] @ content_t)
+        ).tocsr()
+        counts = np.diff(block.indptr)
+        row_ids = np.repeat(np.arange(start, stop), counts)
+        keep = (block.indices != row_ids) & (block.data > 0)
+        row_ids = row_ids[keep]
+        col_ids = block.indices[keep]
+        data = block.data[keep]
+
+        order = np.lexsort((-data, row_ids))
+        row_ids, col_ids, data = row_ids[order], col_ids[order], data[order]
+        first = np.searchsorted(row_ids, row_ids)
+        top = np.arange(len(row_ids)) - first < k
+        rows.append(row_ids[top])
+        cols.append(col_ids[top])
+        scores.append(data[top])
+
+    if not rows:
+        return (np.empty(0, np.int64),) * 2 + (np.empty(0, np.float32),)
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(scores)
+
+
+def load_pairs(queryset, *fields):
+    """Загружает пары id одним запросом в массив n x 2."""
+    return np.fromiter(
+        (value for row in queryset.values_list(*fields) for value in row),
+        dtype=np.int64
+    ).reshape(-1, 2)
+
+
+def build_index(k=SIMILAR_RECIPES_LIMIT, alpha=0.7, max_df=0.01,
+                block_size=512, batch_size=5000):
+    """
+    Пересчитывает индекс похожих рецептов по данным из БД.
+
+    Возвращает число записанных пар.
+    """
+    if sparse is None:
+        raise ImportError('Для построения индекса нужен scipy.')
+
+    recipe_ids = np.fromiter(
+        Recipe.objects.order_by('pk').values_list('pk', flat=True),
+        dtype=np.int64
+    )
+    n_recipes = len(recipe_ids)
+
+    user_recipe, weights = [], []
+    for model, weight in (
+        (Favorites, FAVORITE_WEIGHT), (ShoppingList, SHOPPING_LIST_WEIGHT)
+    ):
+        pairs = load_pairs(model.objects.order_by(), 'recipe_id', 'user_id')
+        user_recipe.append(pairs)
+        weights.append(np.full(len(pairs), weight, dtype=np.float32))
+    user_recipe = np.concatenate(user_recipe)
+    interactions = sparse.coo_matrix(
+        (
+            np.concatenate(weights),
+            (
+                np.searchsorted(recipe_ids, user_recipe[:, 0]),
+                user_recipe[:, 1],
+            ),
+        ),
+        shape=(n_recipes, int(user_recipe[:, 1].max(initial=0)) + 1),
+    ).tocsr()
+
+    recipe_ingredient = load_pairs(
+        IngredientRecipe.objects.order_by(), 'recipe_id', 'ingredient_id'
+    )
+    ingredients = sparse.coo_matrix(
+        (
+            np.ones(len(recipe_ingredient), dtype=np.float32),
+            (
+                np.searchsorted(recipe_ids, recipe_ingredient[:, 0]),
+                recipe_ingredient[:, 1],
+            ),
+        ),
+        shape=(n_recipes, int(recipe_ingredient[:, 1].max(initial=0)) + 1),
+    ).tocsr()
+
+    rows, cols, scores = similarity_topk(
+        interactions, ingredients, k, alpha, max_df, block_size
+    )
+    with transaction.atomic():
+        SimilarRecipe.objects.all().delete()
+        SimilarRecipe.objects.bulk_create(
+            (
+                SimilarRecipe(recipe_id=recipe, similar_id=similar,
+                              score=score)
+                for recipe, similar, score in zip(
+                    recipe_ids[rows].tolist(),
+                    recipe_ids[cols].tolist(),
+                    scores.tolist(),
+                )
+            ),
+            batch_size=batch_size,
+        )
+    return len(rows)
@@ -1,21 +1,35 @@
+from collections.abc import Mapping
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import models
+from django.db.models import prefetch_related_objects
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
 from recipes.models import (Tag, Ingredient, Recipe, FoodgramUser,
                             IngredientRecipe, Subscription,
                             Favorites, ShoppingList)
-from recipes.constants import MIN_VALUE, MAX_VALUE
+from recipes.constants import (MIN_VALUE, MAX_VALUE, BULK_LIMIT,
+                               MAX_RECIPES_LIMIT, TITLE_STR_LIMIT,
+                               IMPORT_LIMIT)
+from .cache import get_recipe_fragments, set_recipe_fragments
+
+
+class AuthorSerializer(serializers.ModelSerializer):
+    """Сериализатор автора без полей, зависящих от пользователя."""
+
+    class Meta:
+        model = FoodgramUser
+        fields = ('id', 'username', 'email', 'first_name', 'last_name',)
 
 
-class FoodgramUserSerializer(serializers.ModelSerializer):
+class FoodgramUserSerializer(AuthorSerializer):
     """Сериализатор для получения кастомной модели пользователя."""
 
     is_subscribed = serializers.SerializerMethodField()
 
-    class Meta:
-        model = FoodgramUser
-        fields = ('id', 'username', 'email', 'first_name',
-                  'last_name', 'is_subscribed',)
+    class Meta(AuthorSerializer.Meta):
+        fields = AuthorSerializer.Meta.fields + ('is_subscribed',)
 
     def get_is_subscribed(self, obj):
         req = self.context['request']
@@ -62,43 +76,226 @@ class CommonRecipeSerializer(serializers.ModelSerializer):
     image = Base64ImageField(allow_null=False, allow_empty_file=False)
 
 
-class ShowRecipeSerializer(CommonRecipeSerializer):
-    """Сериализатор модели Recipe с показом полной информации о модели."""
+class RecipeFragmentSerializer(CommonRecipeSerializer):
+    """Часть рецепта, одинаковая для всех пользователей."""
 
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    author = AuthorSerializer(read_only=True)
     tags = TagSerializer(many=True)
     ingredients = IngredientRecipeSerializer(
         source='ingredient_recipe', many=True
     )
-    is_favorited = serializers.SerializerMethodField()
-    is_in_shopping_cart = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = (
             'id', 'tags', 'author', 'ingredients', 'name', 'image', 'text',
-            'cooking_time', 'is_favorited', 'is_in_shopping_cart',
+            'cooking_time',
         )
-        read_only_fields = ('author',)
 
-    def get_is_favorited(self, obj):
-        req = self.context['request']
 
-        return req and req.user.is_authenticated and obj.favorites.filter(
-            user=req.user.id
-        ).exists()
+EXPANDABLE_FIELDS = ('author', 'tags')
 
-    def get_is_in_shopping_cart(self, obj):
-        req = self.context['request']
 
-        return req and req.user.is_authenticated and obj.shopping_list.filter(
-            user=req.user.id
-        ).exists()
+def parse_fieldsets(query_params):
+    """
+    Разбирает параметры ?fields= и ?expand= для ShowRecipeSerializer.
+
+    Без fields рецепт отдаётся целиком. С fields возвращаются только
+    перечисленные поля, а author и tags - в виде id, если они
+    не перечислены в expand.
+    """
+    fieldsets = {}
+    for name, allowed in (
+        ('fields', ShowRecipeSerializer.Meta.fields),
+        ('expand', EXPANDABLE_FIELDS),
+    ):
+        values = {
+            value.strip()
+            for raw in query_params.getlist(name)
+            for value in raw.split(',') if value.strip()
+        }
+        unknown = values - set(allowed)
+        if unknown:
+            raise serializers.ValidationError(
+                {name: f'Неизвестные поля: {", ".join(sorted(unknown))}.'}
+            )
+        if values:
+            fieldsets[name] = frozenset(values)
+    return fieldsets
+
+
+class ShowRecipeListSerializer(serializers.ListSerializer):
+    """Список рецептов, собираемый из кэша фрагментов за один проход."""
+
+    def to_representation(self, data):
+        if isinstance(data, models.manager.BaseManager):
+            data = data.all()
+        return self.child.represent(list(data))
+
+
+class ShowRecipeSerializer(serializers.BaseSerializer):
+    """
+    Сериализатор модели Recipe с показом полной информации о модели.
+
+    Только для чтения: рецепт собирается из фрагмента, общего для всех
+    пользователей, и флагов текущего пользователя.
+    """
+
+    class Meta:
+        fields = RecipeFragmentSerializer.Meta.fields + (
+            'is_favorited', 'is_in_shopping_cart',
+        )
+        list_serializer_class = ShowRecipeListSerializer
+
+    def to_representation(self, instance):
+        return self.represent([instance])[0]
+
+    def represent(self, recipes):
+        """
+        Собирает рецепты из закэшированных фрагментов.
+
+        Недостающие фрагменты сериализуются одним проходом с prefetch,
+        флаги пользователя добавляются тремя запросами на страницу.
+        При ?fields= недостающие фрагменты строятся только из нужных
+        полей и не кэшируются.
+        """
+        fields = self.context.get('fields')
+        expand = self.context.get('expand', frozenset())
+        if fields is None:
+            fields, expand = self.Meta.fields, EXPANDABLE_FIELDS
+
+        fragment_fields = set(fields)
+        if 'author' not in expand:
+            fragment_fields.discard('author')
+        fragments = self.get_fragments(recipes, fragment_fields)
+        favorited, in_cart, subscribed = self.get_user_flags(
+            recipes, fields, expand
+        )
+        representation = []
+        for recipe in recipes:
+            item = {
+                **fragments[recipe.pk],
+                'is_favorited': recipe.pk in favorited,
+                'is_in_shopping_cart': recipe.pk in in_cart,
+            }
+            if 'author' in fields:
+                item['author'] = (
+                    {
+                        **item['author'],
+                        'is_subscribed': recipe.author_id in subscribed,
+                    } if 'author' in expand else recipe.author_id
+                )
+            if 'tags' in fields and 'tags' not in expand:
+                item['tags'] = [tag['id'] for tag in item['tags']]
+            representation.append(
+                {name: item[name] for name in self.Meta.fields
+                 if name in fields}
+            )
+        return representation
+
+    def get_fragments(self, recipes, fields):
+        request = self.context.get('request')
+        host = request.get_host() if request else ''
+        fragments, versions = get_recipe_fragments(
+            [recipe.pk for recipe in recipes], host
+        )
+        missing = [recipe for recipe in recipes if recipe.pk not in fragments]
+        if not missing:
+            return fragments
+
+        complete = set(RecipeFragmentSerializer.Meta.fields) <= fields
+        lookups = [
+            lookup for name, lookup in (
+                ('tags', 'tags'),
+                ('ingredients', 'ingredient_recipe__ingredient'),
+            ) if name in fields
+        ]
+        prefetch_related_objects(missing, *lookups)
+        new_fragments = {
+            recipe.pk: fragment for recipe, fragment in zip(
+                missing,
+                RecipeFragmentSerializer(
+                    missing, many=True, context=self.context,
+                    fields=None if complete else fields
+                ).data
+            )
+        }
+        if complete:
+            set_recipe_fragments(new_fragments, versions, host)
+        fragments.update(new_fragments)
+        return fragments
+
+    def get_user_flags(self, recipes, fields, expand):
+        request = self.context.get('request')
+        if not (request and request.user.is_authenticated and recipes):
+            return set(), set(), set()
+        user = request.user
+        recipe_ids = [recipe.pk for recipe in recipes]
+        favorited = in_cart = subscribed = set()
+        if 'is_favorited' in fields:
+            favorited = set(Favorites.objects.filter(
+                user=user, recipe__in=recipe_ids
+            ).order_by().values_list('recipe_id', flat=True))
+        if 'is_in_shopping_cart' in fields:
+            in_cart = set(ShoppingList.objects.filter(
+                user=user, recipe__in=recipe_ids
+            ).order_by().values_list('recipe_id', flat=True))
+        if 'author' in fields and 'author' in expand:
+            subscribed = set(Subscription.objects.filter(
+                follower=user,
+                author__in={recipe.author_id for recipe in recipes}
+            ).values_list('author_id', flat=True))
+        return favorited, in_cart, subscribed
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField с загрузкой объектов одним запросом.
+
+    После prefetch(values) значения ищутся в словаре из in_bulk,
+    ошибки валидации остаются такими же, как у PrimaryKeyRelatedField.
+    """
+
+    objects = None
+
+    def to_pk(self, data):
+        return self.get_queryset().model._meta.pk.to_python(data)
+
+    def prefetch(self, values):
+        pks = set()
+        for value in values:
+            try:
+                pks.add(self.to_pk(value))
+            except (TypeError, ValueError, DjangoValidationError):
+                continue
+        self.objects = self.get_queryset().in_bulk(pks)
+
+    def to_internal_value(self, data):
+        if self.objects is None:
+            return super().to_internal_value(data)
+        try:
+            pk = self.to_pk(data)
+        except (TypeError, ValueError, DjangoValidationError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in self.objects:
+            self.fail('does_not_exist', pk_value=data)
+        return self.objects[pk]
+
+
+def as_list(value):
+    return value if isinstance(value, (list, tuple)) else ()
 
 
 class AddIngredientRecipeSerializer(serializers.ModelSerializer):
     """ Сериализатор добавления ингредиента в рецепт. """
 
-    id = serializers.PrimaryKeyRelatedField(
+    id = BulkPrimaryKeyRelatedField(
         queryset=Ingredient.objects.all()
     )
     amount = serializers.IntegerField(
@@ -120,7 +317,7 @@ class AddIngredientRecipeSerializer(serializers.ModelSerializer):
 class CreateRecipeSerializer(CommonRecipeSerializer):
     """Сериализатор создания модели Recipe."""
 
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         many=True,
         queryset=Tag.objects.all()
     )
@@ -141,6 +338,32 @@ class CreateRecipeSerializer(CommonRecipeSerializer):
         )
         read_only_fields = ('author',)
 
+    references_prefetched = False
+
+    def prefetch_references(self, records):
+        """Загружает теги и ингредиенты всех записей двумя запросами id__in."""
+        records = [data for data in records if isinstance(data, Mapping)]
+        self.fields['tags'].child_relation.prefetch(
+            tag
+            for data in records
+            for tag in (
+                data.getlist('tags') if hasattr(data, 'getlist')
+                else as_list(data.get('tags'))
+            )
+        )
+        self.fields['ingredients'].child.fields['id'].prefetch(
+            ingredient.get('id')
+            for data in records
+            for ingredient in as_list(data.get('ingredients'))
+            if isinstance(ingredient, Mapping)
+        )
+        self.references_prefetched = True
+
+    def to_internal_value(self, data):
+        if not self.references_prefetched:
+            self.prefetch_references((data,))
+        return super().to_internal_value(data)
+
     def validate(self, data):
         if 'ingredients' not in data:
             raise serializers.ValidationError(
@@ -203,6 +426,18 @@ class CreateRecipeSerializer(CommonRecipeSerializer):
         return super().update(instance, validated_data)
 
 
+class ImportRecipeSerializer(CreateRecipeSerializer):
+    """
+    Проверка записи массового импорта рецептов.
+
+    Изображение остаётся строкой base64 и декодируется отдельно в пуле
+    потоков, уникальность названий проверяется одним запросом на пачку.
+    """
+
+    image = serializers.CharField()
+    name = serializers.CharField(max_length=TITLE_STR_LIMIT)
+
+
 class ShortRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор получения короткого описания модели Recipe."""
 
@@ -225,16 +460,14 @@ class GetSubscriptionSerializer(FoodgramUserSerializer):
         )
 
     def get_recipes(self, obj):
-        recipes = obj.recipes.all()
         request = self.context['request']
-        limit = request.query_params.get('recipes_limit')
-        if limit:
-            try:
-                recipes = recipes[:int(limit)]
-            except ValueError:
-                pass
+        try:
+            limit = int(request.query_params['recipes_limit'])
+        except (KeyError, ValueError):
+            limit = MAX_RECIPES_LIMIT
+        limit = min(max(limit, 0), MAX_RECIPES_LIMIT)
         return ShortRecipeSerializer(
-            recipes,
+            obj.recipes.all()[:limit],
             many=True,
             context=self.context
         ).data
@@ -243,9 +476,14 @@ class GetSubscriptionSerializer(FoodgramUserSerializer):
 class CreateSubscriptionSerializer(serializers.ModelSerializer):
     """Сериализатор создания модели Subscription."""
 
+    follower = serializers.HiddenField(
+        default=serializers.CurrentUserDefault()
+    )
+
     class Meta:
         model = Subscription
         fields = ('follower', 'author')
+        validators = ()
 
     def to_representation(self, instance):
         return GetSubscriptionSerializer(
@@ -254,43 +492,44 @@ class CreateSubscriptionSerializer(serializers.ModelSerializer):
         ).data
 
     def validate(self, data):
-        current_user = data['follower']
-        author = data['author']
-
-        if current_user == author:
+        if data['follower'] == data['author']:
             raise serializers.ValidationError(
                 {'detail': 'Нельзя подписываться на самого себя'}
             )
-        if author.author.filter(follower=current_user).exists():
-            raise serializers.ValidationError({'detail': 'Уже подписан'})
 
         return data
 
+    def create(self, validated_data):
+        subscription = Subscription.objects.add(**validated_data)
+        if subscription is None:
+            raise serializers.ValidationError({'detail': 'Уже подписан'})
+
+        return subscription
+
 
 class FavoritesShoppingListSerializer(serializers.ModelSerializer):
     """Базовый сериализатор для Favorites и ShoppingList."""
+
+    user = serializers.HiddenField(default=serializers.CurrentUserDefault())
+
     class Meta:
         fields = ('user', 'recipe',)
+        validators = ()
 
     def to_representation(self, instance):
         return ShortRecipeSerializer(
             instance=instance.recipe
         ).data
 
-    def validate(self, data):
-        current_user_id = data['user'].id
-        recipe_id = data['recipe'].id
+    def create(self, validated_data):
         model = self.Meta.model
-
-        if model.objects.filter(
-            user=current_user_id,
-            recipe=recipe_id
-        ).exists():
+        obj = model.objects.add(**validated_data)
+        if obj is None:
             raise serializers.ValidationError(
                 {model._meta.verbose_name: f'Уже в {model._meta.verbose_name}'}
             )
 
-        return data
+        return obj
 
 
 class FavoritesSerializer(FavoritesShoppingListSerializer):
@@ -305,3 +544,27 @@ class ShoppingListSerializer(FavoritesShoppingListSerializer):
 
     class Meta(FavoritesShoppingListSerializer.Meta):
         model = ShoppingList
+        fields = FavoritesShoppingListSerializer.Meta.fields + ('servings',)
+
+
+class BulkRecipesSerializer(serializers.Serializer):
+    """Сериализатор списка рецептов для массовых операций."""
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=MIN_VALUE),
+        allow_empty=False,
+        max_length=BULK_LIMIT,
+    )
+
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
+
+
+class ImportRecipesSerializer(serializers.Serializer):
+    """Сериализатор пачки рецептов для импорта через API."""
+
+    recipes = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+        max_length=IMPORT_LIMIT,
+    )
@@ -0,0 +1,138 @@
+from django.contrib.auth.signals import user_logged_out
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.models import (FoodgramUser, Ingredient, IngredientRecipe,
+                            Recipe, Tag)
+from .authentication import invalidate_tokens
+from .cache import bump_catalog_version, bump_versions
+from .snapshots import SNAPSHOT_DELAY, SNAPSHOT_PENDING_KEY
+from .tasks import (delete_orphaned_images, invalidate_author_recipes,
+                    invalidate_ingredient_recipes, invalidate_tag_recipes,
+                    publish_ingredient_snapshot)
+
+AUTHOR_FIELDS = frozenset(
+    ('username', 'email', 'first_name', 'last_name')
+)
+
+
+def invalidate(recipe_ids):
+    """Сбрасывает кэш после фиксации транзакции."""
+    recipe_ids = tuple(recipe_ids)
+    if recipe_ids:
+        transaction.on_commit(lambda: bump_versions(recipe_ids))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    invalidate((instance.pk,))
+
+
+@receiver(pre_save, sender=Recipe)
+def recipe_image_replacing(sender, instance, **kwargs):
+    if instance.pk is None:
+        return
+    old_image = Recipe.objects.filter(pk=instance.pk).values_list(
+        'image', flat=True
+    ).first()
+    if old_image and old_image != instance.image.name:
+        instance._replaced_image = old_image
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_replaced(sender, instance, **kwargs):
+    # Задача ставится после UPDATE: иначе вне транзакции она могла
+    # выполниться раньше и найти старое имя ещё в базе.
+    old_image = instance.__dict__.pop('_replaced_image', None)
+    if old_image:
+        delete_orphaned_images.delay((old_image,))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_image_deleted(sender, instance, **kwargs):
+    if instance.image:
+        delete_orphaned_images.delay((instance.image.name,))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if isinstance(instance, Recipe):
+        invalidate((instance.pk,))
+    else:
+        invalidate(pk_set or ())
+
+
+@receiver(post_save, sender=IngredientRecipe)
+@receiver(post_delete, sender=IngredientRecipe)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    invalidate((instance.recipe_id,))
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    invalidate(instance.recipes.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def catalog_changed(sender, **kwargs):
+    name = 'tags' if sender is Tag else 'ingredients'
+    transaction.on_commit(lambda: bump_catalog_version(name))
+
+
+@receiver(post_save, sender=Tag)
+def tag_changed(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_tag_recipes.delay_cached(instance.pk)
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_changed(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_ingredient_recipes.delay_cached(instance.pk)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_catalog_changed(sender, **kwargs):
+    # Первое изменение открывает окно SNAPSHOT_DELAY секунд и ставит
+    # задачу на его конец, остальные изменения окна попадут в тот же
+    # снимок. Если изменение всё же разминётся с задачей, снимок для
+    # новой версии справочника запишет манифест.
+    if cache.add(SNAPSHOT_PENDING_KEY, True, SNAPSHOT_DELAY):
+        publish_ingredient_snapshot.delay_in(SNAPSHOT_DELAY)
+
+
+@receiver(post_save, sender=FoodgramUser)
+def author_changed(sender, instance, created, update_fields=None, **kwargs):
+    if created or (
+        update_fields is not None and not AUTHOR_FIELDS & update_fields
+    ):
+        return
+    invalidate_author_recipes.delay_cached(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    invalidate_tokens((instance.key,), instance.user_id)
+
+
+@receiver(post_save, sender=FoodgramUser)
+@receiver(user_logged_out)
+def user_tokens_changed(sender, user=None, instance=None, **kwargs):
+    user = user or instance
+    if user is None:
+        return
+    invalidate_tokens(
+        Token.objects.filter(user=user).values_list('key', flat=True),
+        user.pk,
+    )
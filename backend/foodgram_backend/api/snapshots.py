@@ -0,0 +1,110 @@
+import gzip
+import json
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+
+from recipes.models import Ingredient
+from recipes.storage import ContentHashStorage, content_hash_path
+from .cache import get_catalog_version
+
+SNAPSHOT_FIELDS = ('id', 'name', 'measurement_unit')
+SNAPSHOT_DIRECTORY = 'catalog/ingredients'
+SNAPSHOT_KEY = 'catalog:ingredients:snapshot:{}'
+SNAPSHOT_PENDING_KEY = 'catalog:ingredients:snapshot:pending'
+# Изменения справочника в течение SNAPSHOT_DELAY секунд собираются
+# в один снимок.
+SNAPSHOT_DELAY = 5
+SNAPSHOT_KEEP = 3
+
+storage = ContentHashStorage()
+
+
+def render_snapshot():
+    """Компактный JSON справочника: имена полей и строки-массивы."""
+    items = list(
+        Ingredient.objects.order_by('pk').values_list(*SNAPSHOT_FIELDS)
+    )
+    body = json.dumps(
+        {'fields': SNAPSHOT_FIELDS, 'items': items},
+        ensure_ascii=False,
+        separators=(',', ':'),
+    ).encode()
+    return body, len(items)
+
+
+def publish_snapshot():
+    """
+    Записывает снимок справочника ингредиентов и возвращает манифест.
+
+    Имя файла - хэш содержимого, поэтому nginx отдаёт его с вечным
+    кэшированием, а неизменившийся справочник не перезаписывается.
+    Рядом сохраняется .gz для gzip_static. Манифест кэшируется
+    по версии справочника не дольше CATALOG_CACHE_TIMEOUT, старые
+    снимки удаляются.
+    """
+    version = get_catalog_version('ingredients')
+    body, count = render_snapshot()
+    content = ContentFile(body)
+    name = content_hash_path(content, SNAPSHOT_DIRECTORY, 'snapshot.json')
+    if not storage.exists(name):
+        storage.save(
+            f'{name}.gz', ContentFile(gzip.compress(body, mtime=0))
+        )
+        storage.save(name, content)
+        prune_snapshots(name)
+    manifest = {
+        'version': os.path.splitext(os.path.basename(name))[0],
+        'url': storage.url(name),
+        'count': count,
+        'size': len(body),
+    }
+    cache.set(
+        SNAPSHOT_KEY.format(version), (name, manifest),
+        settings.CATALOG_CACHE_TIMEOUT
+    )
+    return manifest
+
+
+def snapshot_names():
+    """Все файлы снимков (без .gz) в хранилище."""
+    names = []
+    for first in storage.listdir(SNAPSHOT_DIRECTORY)[0]:
+        for second in storage.listdir(f'{SNAPSHOT_DIRECTORY}/{first}')[0]:
+            directory = f'{SNAPSHOT_DIRECTORY}/{first}/{second}'
+            names.extend(
+                f'{directory}/{name}'
+                for name in storage.listdir(directory)[1]
+                if name.endswith('.json')
+            )
+    return names
+
+
+def prune_snapshots(current, keep=SNAPSHOT_KEEP):
+    """
+    Оставляет текущий снимок и keep - 1 самых новых из остальных:
+    клиенты с закэшированным манифестом успевают скачать прежний.
+    """
+    others = sorted(
+        (name for name in snapshot_names() if name != current),
+        key=storage.get_modified_time,
+        reverse=True,
+    )
+    for name in others[keep - 1:]:
+        storage.delete(f'{name}.gz')
+        storage.delete(name)
+
+
+def get_snapshot_manifest():
+    """
+    Манифест текущего снимка. Снимок пишется заново при смене версии
+    справочника и если файл из манифеста уже удалён.
+    """
+    cached = cache.get(
+        SNAPSHOT_KEY.format(get_catalog_version('ingredients'))
+    )
+    if cached is None or not storage.exists(cached[0]):
+        return publish_snapshot()
+    return cached[1]
@@ -0,0 +1,49 @@
+from recipes.models import IngredientRecipe, Recipe
+from .cache import bump_versions
+from .queue import task
+from .snapshots import get_snapshot_manifest
+
+
+def bump_recipes(queryset):
+    recipe_ids = tuple(queryset.values_list('pk', flat=True))
+    if recipe_ids:
+        bump_versions(recipe_ids)
+
+
+@task
+def delete_orphaned_images(names):
+    """Удаляет файлы изображений, на которые не ссылается ни один рецепт."""
+    storage = Recipe._meta.get_field('image').storage
+    used = set(Recipe.objects.filter(image__in=names).values_list(
+        'image', flat=True
+    ))
+    for name in set(names) - used:
+        storage.delete(name)
+
+
+@task
+def invalidate_tag_recipes(tag_id):
+    """Сбрасывает кэш рецептов с изменённым тегом."""
+    bump_recipes(Recipe.objects.filter(tags=tag_id))
+
+
+@task
+def invalidate_ingredient_recipes(ingredient_id):
+    """Сбрасывает кэш рецептов с изменённым ингредиентом."""
+    bump_recipes(Recipe.objects.filter(
+        pk__in=IngredientRecipe.objects.filter(
+            ingredient=ingredient_id
+        ).values('recipe')
+    ))
+
+
+@task
+def invalidate_author_recipes(author_id):
+    """Сбрасывает кэш рецептов автора после изменения его данных."""
+    bump_recipes(Recipe.objects.filter(author=author_id))
+
+
+@task
+def publish_ingredient_snapshot():
+    """Записывает снимок справочника, если для его версии снимка нет."""
+    get_snapshot_manifest()
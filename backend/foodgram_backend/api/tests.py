@@ -0,0 +1,584 @@
+import tempfile
+import threading
+from http import HTTPStatus
+from unittest import mock, skipUnless
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.paginator import EmptyPage
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+
+from api.authentication import (USER_GENERATION_KEY,
+                                CachedTokenAuthentication, token_cache)
+from api.cache import (RECIPE_FRAGMENT_KEY, RECIPE_VERSION_KEY,
+                       get_recipe_version)
+from api.models import QueuedTask
+from api.pagination import ApproximatePaginator
+from api.queue import DatabaseBackend, ImmediateBackend
+from api.recommendations import similarity_topk, sparse
+from api.snapshots import get_snapshot_manifest, storage
+from recipes.models import (Favorites, FoodgramUser, Ingredient, Recipe,
+                            ShoppingList, Subscription, Tag)
+
+STATEMENTS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE')
+
+
+def create_user(username):
+    return FoodgramUser.objects.create(
+        username=username,
+        email=f'{username}@example.com',
+        first_name=username,
+        last_name=username,
+    )
+
+
+def create_recipe(author, name='Рецепт'):
+    return Recipe.objects.create(
+        author=author,
+        name=name,
+        image='recipes/test.gif',
+        text='Описание',
+        cooking_time=10,
+    )
+
+
+def statements(context):
+    """SQL-запросы без BEGIN/SAVEPOINT/COMMIT."""
+    return [
+        query['sql'] for query in context.captured_queries
+        if query['sql'].lstrip().upper().startswith(STATEMENTS)
+    ]
+
+
+class RelationQuerySetTests(TestCase):
+    """RelationQuerySet.add: один INSERT ... ON CONFLICT DO NOTHING."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('user')
+        cls.recipe = create_recipe(create_user('author'))
+
+    def test_add_creates_object(self):
+        with CaptureQueriesContext(connection) as context:
+            favorite = Favorites.objects.add(
+                user=self.user, recipe=self.recipe
+            )
+        self.assertEqual(len(statements(context)), 1)
+        self.assertIsNotNone(favorite.pk)
+        self.assertTrue(Favorites.objects.filter(pk=favorite.pk).exists())
+
+    def test_add_duplicate_returns_none(self):
+        Favorites.objects.add(user=self.user, recipe=self.recipe)
+        with CaptureQueriesContext(connection) as context:
+            duplicate = Favorites.objects.add(
+                user=self.user, recipe=self.recipe
+            )
+        self.assertIsNone(duplicate)
+        self.assertEqual(len(statements(context)), 1)
+        self.assertEqual(Favorites.objects.count(), 1)
+
+    def test_duplicate_does_not_break_transaction(self):
+        with transaction.atomic():
+            ShoppingList.objects.add(user=self.user, recipe=self.recipe)
+            ShoppingList.objects.add(user=self.user, recipe=self.recipe)
+            self.assertEqual(ShoppingList.objects.count(), 1)
+
+
+class RelationEndpointsTests(TestCase):
+    """
+    Избранное, список покупок и подписки.
+
+    Раньше POST выполнял 5 запросов (две загрузки по id, проверки
+    UniqueTogetherValidator и .exists(), INSERT), DELETE - 2
+    (.exists() и DELETE). Теперь POST - загрузка цели и INSERT,
+    DELETE - один DELETE, повтор возвращает 400, а не 500.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('user')
+        cls.author = create_user('author')
+        cls.recipe = create_recipe(cls.author)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def request(self, method, url):
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url)
+        return response, statements(context)
+
+    def check_toggle(self, url, model, **fields):
+        response, queries = self.request('post', url)
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertEqual(len(queries), 2)
+
+        response, queries = self.request('post', url)
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(model.objects.filter(**fields).count(), 1)
+
+        response, queries = self.request('delete', url)
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        self.assertEqual(len(queries), 1)
+
+        response, queries = self.request('delete', url)
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(len(queries), 1)
+        self.assertFalse(model.objects.filter(**fields).exists())
+
+    def test_favorite(self):
+        self.check_toggle(
+            f'/api/recipes/{self.recipe.pk}/favorite/',
+            Favorites, user=self.user, recipe=self.recipe
+        )
+
+    def test_shopping_cart(self):
+        self.check_toggle(
+            f'/api/recipes/{self.recipe.pk}/shopping_cart/',
+            ShoppingList, user=self.user, recipe=self.recipe
+        )
+
+    def test_subscribe(self):
+        url = f'/api/users/{self.author.pk}/subscribe/'
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        response, queries = self.request('post', url)
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(len(queries), 2)
+        response, queries = self.request('delete', url)
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        self.assertEqual(len(queries), 1)
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_subscribe_to_self(self):
+        response = self.client.post(f'/api/users/{self.user.pk}/subscribe/')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertFalse(Subscription.objects.exists())
+
+    def test_array_body_ignored(self):
+        response = self.client.post(
+            f'/api/recipes/{self.recipe.pk}/favorite/', [1, 2],
+            format='json'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+
+    def test_shopping_cart_servings(self):
+        url = f'/api/recipes/{self.recipe.pk}/shopping_cart/'
+        response = self.client.post(
+            url, {'servings': 3, 'user': self.author.pk}, format='json'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        cart = ShoppingList.objects.get()
+        self.assertEqual((cart.user, cart.servings), (self.user, 3))
+        response = self.client.patch(url, {'servings': 2}, format='json')
+        self.assertEqual(
+            response.json(), {'id': self.recipe.pk, 'servings': 2}
+        )
+
+    def test_non_numeric_id(self):
+        for method, url in (
+            ('patch', '/api/recipes/abc/shopping_cart/'),
+            ('delete', '/api/recipes/abc/shopping_cart/'),
+            ('delete', '/api/recipes/abc/favorite/'),
+            ('delete', '/api/users/abc/subscribe/'),
+        ):
+            with self.subTest(method=method, url=url):
+                response = getattr(self.client, method)(
+                    url, {'servings': 2}, format='json'
+                )
+                self.assertEqual(
+                    response.status_code, HTTPStatus.BAD_REQUEST
+                )
+
+    def test_insert_after_concurrent_insert(self):
+        """Строка, вставленная другим запросом, даёт 400, а не 500."""
+        Favorites.objects.create(user=self.user, recipe=self.recipe)
+        response = self.client.post(
+            f'/api/recipes/{self.recipe.pk}/favorite/'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Кэш токенов сбрасывается при выходе и деактивации пользователя."""
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = create_user('user')
+        self.token = Token.objects.create(user=self.user)
+        self.authentication = CachedTokenAuthentication()
+
+    def authenticate(self):
+        with CaptureQueriesContext(connection) as context:
+            user, _ = self.authentication.authenticate_credentials(
+                self.token.key
+            )
+        return user, len(statements(context))
+
+    def test_cached_lookup_has_no_queries(self):
+        self.assertEqual(self.authenticate()[1], 1)
+        self.assertEqual(self.authenticate(), (self.user, 0))
+
+    def test_generation_from_other_process_invalidates(self):
+        self.authenticate()
+        # Так сброс из другого процесса выглядит для этого: локальная
+        # запись на месте, поколение в общем кэше новое.
+        cache.set(USER_GENERATION_KEY.format(self.user.pk), 0)
+        self.assertEqual(self.authenticate()[1], 1)
+
+    def test_deactivation(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_token_deleted(self):
+        self.authenticate()
+        self.token.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+
+class ApproximatePaginatorTests(TestCase):
+    """Заниженная оценка count не отклоняет существующие страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        for number in range(10):
+            create_recipe(author, f'Рецепт {number}')
+
+    def paginator(self, estimate):
+        paginator = ApproximatePaginator(Recipe.objects.order_by('pk'), 3)
+        with mock.patch(
+            'api.pagination.approximate_count', return_value=(estimate, True)
+        ):
+            paginator.count
+        return paginator
+
+    def test_page_beyond_estimate(self):
+        page = self.paginator(estimate=2).page(4)
+        self.assertEqual(len(page), 1)
+        self.assertFalse(page.has_next())
+        page = self.paginator(estimate=2).page(2)
+        self.assertEqual(len(page), 3)
+        self.assertTrue(page.has_next())
+
+    def test_empty_page_rejected(self):
+        with self.assertRaises(EmptyPage):
+            self.paginator(estimate=2).page(5)
+        with self.assertRaises(EmptyPage):
+            self.paginator(estimate=2).page(0)
+
+
+class RecipeVersionTests(TestCase):
+    """Версии рецептов в кэше и отключение кэша ответов."""
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(RESPONSE_CACHE=True, RECIPE_CACHE_TIMEOUT=300)
+    def test_missing_recipe_version_expires(self):
+        with mock.patch.object(cache, 'add', wraps=cache.add) as add:
+            response = APIClient().get('/api/recipes/987654/')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        add.assert_called_once_with(
+            RECIPE_VERSION_KEY.format(987654), mock.ANY, timeout=600
+        )
+
+    @override_settings(RESPONSE_CACHE=False)
+    def test_disabled_response_cache(self):
+        recipe = create_recipe(create_user('author'))
+        with mock.patch.object(cache, 'add', wraps=cache.add) as add:
+            response = APIClient().get(f'/api/recipes/{recipe.pk}/')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        add.assert_not_called()
+        self.assertNotIn('ETag', response)
+
+
+class InvalidationTaskTests(TestCase):
+    """Сброс кэша уходит в воркер задач только при общем кэше."""
+
+    def setUp(self):
+        cache.clear()
+        self.tag = Tag.objects.create(name='Завтрак', slug='breakfast')
+        self.recipe = create_recipe(create_user('author'))
+        self.recipe.tags.add(self.tag)
+
+    def rename_tag(self, shared):
+        version = get_recipe_version(self.recipe.pk)
+        with override_settings(CACHE_SHARED=shared), mock.patch(
+            'api.queue.get_backend', return_value=DatabaseBackend()
+        ), self.captureOnCommitCallbacks(execute=True):
+            self.tag.name = 'Обед'
+            self.tag.save()
+        return get_recipe_version(self.recipe.pk) != version
+
+    def test_local_cache_invalidates_in_process(self):
+        self.assertTrue(self.rename_tag(shared=False))
+        self.assertFalse(QueuedTask.objects.exists())
+
+    def test_shared_cache_queues_task(self):
+        self.assertFalse(self.rename_tag(shared=True))
+        self.assertEqual(
+            QueuedTask.objects.get().name, 'api.tasks.invalidate_tag_recipes'
+        )
+
+
+@override_settings(RESPONSE_CACHE=True, CATALOG_CACHE_TIMEOUT=300)
+class CatalogCacheTests(TestCase):
+    """Готовые тела справочников: срок хранения и сброс после изменений."""
+
+    def setUp(self):
+        cache.clear()
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+        self.client = APIClient()
+
+    def test_change_rebuilds_body(self):
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            first = self.client.get('/api/ingredients/')
+        self.assertEqual(cache_set.call_args.args[2], 300)
+        self.assertEqual(len(first.json()), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='Перец', measurement_unit='г')
+        second = self.client.get('/api/ingredients/')
+        self.assertEqual(len(second.json()), 2)
+        self.assertNotEqual(first['ETag'], second['ETag'])
+
+    def test_etag_depends_on_content(self):
+        first = self.client.get('/api/ingredients/')
+        # Версия создана заново (истекла или изменена другим процессом),
+        # а содержимое то же: ETag не меняется.
+        cache.clear()
+        second = self.client.get(
+            '/api/ingredients/', HTTP_IF_NONE_MATCH=first['ETag']
+        )
+        self.assertEqual(second.status_code, HTTPStatus.NOT_MODIFIED)
+
+
+class SnapshotManifestTests(TestCase):
+    """Манифест снимка не ссылается на удалённый файл."""
+
+    def setUp(self):
+        cache.clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_root = override_settings(MEDIA_ROOT=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+
+    def test_manifest_cached(self):
+        manifest = get_snapshot_manifest()
+        with mock.patch('api.snapshots.publish_snapshot') as publish:
+            self.assertEqual(get_snapshot_manifest(), manifest)
+        publish.assert_not_called()
+
+    def test_deleted_file_republished(self):
+        manifest = get_snapshot_manifest()
+        name = manifest['url'][len(settings.MEDIA_URL):]
+        storage.delete(name)
+        self.assertEqual(get_snapshot_manifest(), manifest)
+        self.assertTrue(storage.exists(name))
+
+
+class ReplacedImageTests(TransactionTestCase):
+    """Старое изображение удаляется после UPDATE, а не до него."""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_root = override_settings(MEDIA_ROOT=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        backend = mock.patch(
+            'api.queue.get_backend', return_value=ImmediateBackend()
+        )
+        backend.start()
+        self.addCleanup(backend.stop)
+        self.storage = Recipe._meta.get_field('image').storage
+
+    def test_old_image_deleted(self):
+        old = self.storage.save('recipes/old.gif', ContentFile(b'old'))
+        new = self.storage.save('recipes/new.gif', ContentFile(b'new'))
+        recipe = create_recipe(create_user('author'))
+        Recipe.objects.filter(pk=recipe.pk).update(image=old)
+        recipe.refresh_from_db()
+        recipe.image = new
+        recipe.save()
+        self.assertFalse(self.storage.exists(old))
+        self.assertTrue(self.storage.exists(new))
+
+
+class CompressionMiddlewareTests(TestCase):
+    """Brotli/gzip только для JSON API, остальное - GZipMiddleware."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient(HTTP_ACCEPT_ENCODING='br, gzip')
+        for number in range(100):
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            )
+
+    def test_api_json(self):
+        response = self.client.get('/api/ingredients/')
+        self.assertIn(response['Content-Encoding'], ('br', 'gzip'))
+
+    def test_html_uses_gzip_middleware(self):
+        response = self.client.get('/api/ingredients/?format=api')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        # GZipMiddleware пишет в заголовок gzip случайное имя файла
+        # (флаг FNAME): длина ответа меняется, это защита от BREACH.
+        self.assertTrue(response.content[3] & 0x08)
+
+
+@override_settings(RESPONSE_CACHE=True)
+class RecipeFragmentTests(TestCase):
+    """Фрагменты рецептов: общий кэш, флаги пользователя и версии."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('user')
+        self.recipe = create_recipe(create_user('author'))
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def cached_fragment(self):
+        return cache.get(RECIPE_FRAGMENT_KEY.format(
+            self.recipe.pk, 'testserver'
+        ))
+
+    def test_fragment_merged_with_user_flags(self):
+        other = APIClient()
+        other.force_authenticate(create_user('other'))
+        self.assertFalse(other.get(self.url).json()['is_favorited'])
+        version, fragment = self.cached_fragment()
+        self.assertEqual(version, get_recipe_version(self.recipe.pk))
+        self.assertNotIn('is_favorited', fragment)
+
+        Favorites.objects.create(user=self.user, recipe=self.recipe)
+        with CaptureQueriesContext(connection) as context:
+            data = self.client.get(self.url).json()
+        self.assertTrue(data['is_favorited'])
+        self.assertFalse(data['is_in_shopping_cart'])
+        self.assertEqual(data['author']['is_subscribed'], False)
+        self.assertEqual(data['name'], fragment['name'])
+        # Варианты фильтра тегов, рецепт и три флага пользователя;
+        # теги и ингредиенты рецепта берутся из фрагмента.
+        queries = statements(context)
+        self.assertEqual(len(queries), 5)
+        self.assertFalse(any(
+            'recipes_ingredientrecipe' in sql for sql in queries
+        ))
+
+    def test_edit_rebuilds_fragment(self):
+        self.client.get(self.url)
+        old_version, _ = self.cached_fragment()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.name = 'Новое название'
+            self.recipe.save()
+        self.assertNotEqual(get_recipe_version(self.recipe.pk), old_version)
+
+        self.assertEqual(self.client.get(self.url).json()['name'],
+                         'Новое название')
+        version, fragment = self.cached_fragment()
+        self.assertEqual(version, get_recipe_version(self.recipe.pk))
+        self.assertEqual(fragment['name'], 'Новое название')
+
+    def test_browsable_api(self):
+        for url in ('/api/recipes/', self.url):
+            with self.subTest(url=url):
+                response = self.client.get(url, {'format': 'api'})
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+@skipUnless(sparse, 'Для построения индекса нужен scipy.')
+class SimilarityTests(TestCase):
+    """Общие ингредиенты учитываются и на небольшой базе."""
+
+    def test_shared_ingredient_on_small_dataset(self):
+        ingredients = sparse.csr_matrix(np.array(
+            [[1, 1, 0], [1, 0, 1]] + [[0, 1, 0]] * 98,
+            dtype=np.float32
+        ))
+        interactions = sparse.csr_matrix((100, 1), dtype=np.float32)
+        # Ингредиент 0 есть в двух рецептах из 100 - больше max_df доли.
+        rows, cols, _ = similarity_topk(interactions, ingredients, k=1)
+        self.assertEqual(cols[rows == 1].tolist(), [0])
+
+
+@skipUnless(
+    connection.vendor == 'postgresql',
+    'SQLite блокирует параллельную запись в общую БД тестов.'
+)
+class ConcurrentRelationTests(TransactionTestCase):
+    """Одновременные одинаковые POST: один 201, остальные 400."""
+
+    THREADS = 8
+
+    def setUp(self):
+        self.user = create_user('user')
+        self.author = create_user('author')
+        self.recipe = create_recipe(self.author)
+
+    def post_concurrently(self, url):
+        barrier = threading.Barrier(self.THREADS)
+        statuses = []
+
+        def post():
+            client = APIClient()
+            client.force_authenticate(self.user)
+            try:
+                barrier.wait()
+                statuses.append(client.post(url).status_code)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=post) for _ in range(self.THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sorted(statuses)
+
+    def check_concurrent(self, url, model, **fields):
+        self.assertEqual(
+            self.post_concurrently(url),
+            [HTTPStatus.CREATED] + [HTTPStatus.BAD_REQUEST] * (
+                self.THREADS - 1
+            ),
+        )
+        self.assertEqual(model.objects.filter(**fields).count(), 1)
+
+    def test_favorite(self):
+        self.check_concurrent(
+            f'/api/recipes/{self.recipe.pk}/favorite/',
+            Favorites, user=self.user, recipe=self.recipe
+        )
+
+    def test_shopping_cart(self):
+        self.check_concurrent(
+            f'/api/recipes/{self.recipe.pk}/shopping_cart/',
+            ShoppingList, user=self.user, recipe=self.recipe
+        )
+
+    def test_subscribe(self):
+        self.check_concurrent(
+            f'/api/users/{self.author.pk}/subscribe/',
+            Subscription, follower=self.user, author=self.author
+        )
@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import (AnonRateThrottle, SimpleRateThrottle,
+                                       UserRateThrottle)
+
+throttle_cache = caches[settings.THROTTLE_CACHE]
+
+# Ключ WSGI environ без префикса HTTP_ нельзя передать заголовком,
+# его выставляют только запросы внутри процесса (прогрев кэша).
+INTERNAL_REQUEST = 'foodgram.internal'
+
+
+def is_internal(request):
+    return bool(request.META.get(INTERNAL_REQUEST))
+
+
+class InternalRequestMixin:
+    """Внутренние запросы не ограничиваются."""
+
+    def allow_request(self, request, view):
+        return is_internal(request) or super().allow_request(request, view)
+
+
+class AnonThrottle(InternalRequestMixin, AnonRateThrottle):
+    """Общий лимит запросов анонима по IP."""
+
+    cache = throttle_cache
+
+
+class UserThrottle(InternalRequestMixin, UserRateThrottle):
+    """Общий лимит запросов пользователя."""
+
+    cache = throttle_cache
+
+
+class ActionThrottle(SimpleRateThrottle):
+    """
+    Отдельный лимит для дорогих действий.
+
+    Действие связывается с областью через атрибут throttle_scopes
+    представления ({действие: область}). Лимит берётся из
+    DEFAULT_THROTTLE_RATES по ключу '<область>_user' для пользователей
+    и '<область>_anon' для анонимов (считается по IP). Действия без
+    области или без заданного лимита не ограничиваются.
+    """
+
+    cache = throttle_cache
+
+    def __init__(self):
+        # Лимит зависит от действия, поэтому определяется в allow_request.
+        pass
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scopes', {}).get(
+            getattr(view, 'action', None)
+        )
+        if scope is None or is_internal(request):
+            return True
+
+        audience = 'user' if request.user.is_authenticated else 'anon'
+        self.scope = f'{scope}_{audience}'
+        if self.scope not in self.THROTTLE_RATES:
+            return True
+
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
+
+    def get_cache_key(self, request, view):
+        if request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
@@ -1,29 +1,64 @@
+from collections.abc import Mapping
 from http import HTTPStatus
 
+from django.conf import settings
+from django.db import transaction
 from django.http import HttpResponse, FileResponse
-from django.db.models import Sum, Count, F
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.functional import cached_property
+from django.utils.http import quote_etag
+from django.db.models import Count, Q, Sum
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import viewsets
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated, SAFE_METHODS
-from rest_framework.pagination import PageNumberPagination
 
+from .aggregation import aggregate_ingredients, shopping_cart_totals
+from .cache import AnonymousCacheMixin, CatalogCacheMixin
+from .database import StatementTimeoutMixin
+from .importing import import_recipes
 from .filterset import RecipeFilter, IngredientFilter
+from .pagination import RecipePagination
+from .snapshots import get_snapshot_manifest
 from recipes.models import (Tag, Ingredient, Recipe, FoodgramUser,
                             Subscription, Favorites, ShoppingList,
-                            IngredientRecipe)
+                            IngredientRecipe, SimilarRecipe)
+from recipes.constants import SIMILAR_RECIPES_LIMIT
 from .permissions import IsAuthorOrReadOnly
 from .serializers import (TagSerializer, IngredientSerializer,
                           CreateRecipeSerializer, GetSubscriptionSerializer,
                           ShowRecipeSerializer, FavoritesSerializer,
-                          ShoppingListSerializer, CreateSubscriptionSerializer)
+                          ShoppingListSerializer, CreateSubscriptionSerializer,
+                          BulkRecipesSerializer, ImportRecipesSerializer,
+                          parse_fieldsets)
 
 
-class FoodgramUserViewSet(UserViewSet):
+def parse_id(value):
+    """id из URL; нечисловое значение - ошибка 400, а не ValueError."""
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({'id': f'Некорректный id: {value}.'})
+
+
+def delete_object(model, **fields):
+    """Удаляет связь одним DELETE, проверяя число удалённых строк."""
+    deleted, _ = model.objects.filter(**fields).delete()
+    if not deleted:
+        return HttpResponse(status=HTTPStatus.BAD_REQUEST)
+
+    return HttpResponse(status=HTTPStatus.NO_CONTENT)
+
+
+class FoodgramUserViewSet(StatementTimeoutMixin, UserViewSet):
     """Получение информация о пользователе."""
 
+    throttle_scopes = {'subscriptions': 'subscriptions'}
+    statement_timeouts = {'list': 'listing', 'subscriptions': 'listing'}
+
     def get_permissions(self):
         if self.action == 'me':
             return (IsAuthenticated(),)
@@ -55,40 +90,30 @@ class FoodgramUserViewSet(UserViewSet):
         permission_classes=(IsAuthenticated,)
     )
     def subscribe(self, request, id):
-        data = {
-            'follower': request.user.id,
-            'author': id
-        }
         serializer = CreateSubscriptionSerializer(
-            data=data, context={'request': request, })
+            data={'author': id}, context={'request': request, })
         serializer.is_valid(raise_exception=True)
         serializer.save()
         return Response(serializer.data, status=HTTPStatus.CREATED)
 
     @subscribe.mapping.delete
     def delete_subscribe(self, request, id):
-        subscription = Subscription.objects.filter(
-            follower=self.request.user.id,
-            author=id
+        return delete_object(
+            Subscription, follower=request.user.id, author=parse_id(id)
         )
 
-        if not subscription.exists():
-            return HttpResponse(status=HTTPStatus.BAD_REQUEST)
-
-        subscription.delete()
 
-        return HttpResponse(status=HTTPStatus.NO_CONTENT)
-
-
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     """Получение информация о Тегах."""
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
+    catalog_name = 'tags'
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(StatementTimeoutMixin, CatalogCacheMixin,
+                        viewsets.ReadOnlyModelViewSet):
     """Получение информация об Ингредиентах."""
 
     queryset = Ingredient.objects.all()
@@ -96,18 +121,66 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
+    throttle_scopes = {'list': 'ingredients'}
+    statement_timeouts = {'list': 'listing'}
+    catalog_name = 'ingredients'
+
+    @action(detail=False, methods=('GET', ))
+    def snapshot(self, request):
+        """Адрес и версия снимка справочника для поиска на клиенте."""
+        manifest = get_snapshot_manifest()
+        response = Response({
+            **manifest, 'url': request.build_absolute_uri(manifest['url'])
+        })
+        etag = quote_etag(manifest['version'])
+        response['ETag'] = etag
+        patch_cache_control(
+            response, public=True, max_age=settings.RECIPE_CACHE_MAX_AGE
+        )
+        return get_conditional_response(
+            request, etag=etag, response=response
+        )
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(StatementTimeoutMixin, AnonymousCacheMixin,
+                    viewsets.ModelViewSet):
     """Набор представлений Рецепта."""
 
-    queryset = Recipe.objects.all().select_related(
-        'author'
-    ).prefetch_related('tags', 'ingredients')
+    queryset = Recipe.objects.all().select_related('author')
     permission_classes = (IsAuthorOrReadOnly,)
-    pagination_class = PageNumberPagination
+    pagination_class = RecipePagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    throttle_scopes = {
+        'download_shopping_cart': 'shopping_cart_download',
+        'ingredients_summary': 'ingredients_summary',
+        'recommended': 'recommended',
+        'bulk_import': 'recipes_import',
+    }
+    statement_timeouts = {
+        'list': 'listing',
+        'similar': 'listing',
+        'recommended': 'listing',
+        'download_shopping_cart': 'export',
+        'ingredients_summary': 'export',
+        'bulk_import': 'export',
+    }
+
+    @cached_property
+    def fieldsets(self):
+        if self.request.method not in SAFE_METHODS:
+            return {}
+        return parse_fieldsets(self.request.query_params)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.fieldsets.get('fields')
+        if fields is not None and 'text' not in fields:
+            queryset = queryset.defer('text')
+        return queryset
+
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), **self.fieldsets}
 
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
@@ -115,11 +188,17 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return CreateRecipeSerializer
 
     @staticmethod
-    def write_object(serializer_class, pk, request):
-        data = {
-            'user': request.user.id,
-            'recipe': pk
-        }
+    def write_object(serializer_class, pk, request, body_fields=()):
+        """
+        Создаёт связь пользователя с рецептом pk. Из тела запроса берутся
+        только body_fields, и только если тело - JSON-объект.
+        """
+        data = {'recipe': pk}
+        if isinstance(request.data, Mapping):
+            data.update(
+                (name, request.data[name]) for name in body_fields
+                if name in request.data
+            )
         serializer = serializer_class(
             data=data, context={'request': request, })
 
@@ -127,6 +206,95 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer.save()
         return Response(serializer.data, status=HTTPStatus.CREATED)
 
+    @staticmethod
+    def bulk_write_objects(model, request):
+        """Массово добавляет или удаляет рецепты из списка пользователя."""
+
+        serializer = BulkRecipesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        user_objects = model.objects.filter(user=request.user)
+
+        with transaction.atomic():
+            existing = set(user_objects.filter(
+                recipe__in=recipe_ids
+            ).order_by().values_list('recipe_id', flat=True))
+
+            if request.method == 'DELETE':
+                user_objects.filter(recipe__in=existing).delete()
+                statuses = {True: 'removed', False: 'absent'}
+                results = [
+                    {'id': pk, 'status': statuses[pk in existing]}
+                    for pk in recipe_ids
+                ]
+                return Response(results, status=HTTPStatus.OK)
+
+            found = set(Recipe.objects.filter(
+                pk__in=recipe_ids
+            ).values_list('pk', flat=True))
+            model.objects.bulk_create(
+                (
+                    model(user=request.user, recipe_id=pk)
+                    for pk in found - existing
+                ),
+                ignore_conflicts=True
+            )
+
+        results = []
+        for pk in recipe_ids:
+            if pk not in found:
+                status = 'not_found'
+            elif pk in existing:
+                status = 'exists'
+            else:
+                status = 'added'
+            results.append({'id': pk, 'status': status})
+        return Response(results, status=HTTPStatus.OK)
+
+    @action(
+        methods=('POST', 'DELETE'),
+        detail=False,
+        url_path='favorite/bulk',
+        permission_classes=(IsAuthenticated,)
+    )
+    def bulk_favorite(self, request):
+        return self.bulk_write_objects(Favorites, request)
+
+    @action(
+        methods=('POST', 'DELETE'),
+        detail=False,
+        url_path='shopping_cart/bulk',
+        permission_classes=(IsAuthenticated,)
+    )
+    def bulk_shopping_cart(self, request):
+        return self.bulk_write_objects(ShoppingList, request)
+
+    @action(
+        methods=('POST', ),
+        detail=False,
+        url_path='import',
+        permission_classes=(IsAuthenticated,)
+    )
+    def bulk_import(self, request):
+        serializer = ImportRecipesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        report = import_recipes(
+            serializer.validated_data['recipes'],
+            request.user,
+            context={'request': request},
+        )
+        return Response(report, status=HTTPStatus.OK)
+
+    @action(
+        methods=('DELETE', ),
+        detail=False,
+        url_path='shopping_cart/clear',
+        permission_classes=(IsAuthenticated,)
+    )
+    def clear_shopping_cart(self, request):
+        deleted, _ = ShoppingList.objects.filter(user=request.user).delete()
+        return Response({'removed': deleted}, status=HTTPStatus.OK)
+
     @action(
         methods=('POST', ),
         detail=True,
@@ -137,16 +305,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @favorite.mapping.delete
     def delete_favorite(self, request, pk):
-        favorite = Favorites.objects.filter(
-            user=self.request.user.id,
-            recipe=pk
+        return delete_object(
+            Favorites, user=request.user.id, recipe=parse_id(pk)
         )
-        if not favorite.exists():
-            return HttpResponse(status=HTTPStatus.BAD_REQUEST)
-
-        favorite.delete()
-
-        return HttpResponse(status=HTTPStatus.NO_CONTENT)
 
     @action(
         methods=('POST', ),
@@ -154,20 +315,97 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=(IsAuthenticated,)
     )
     def shopping_cart(self, request, pk):
-        return self.write_object(ShoppingListSerializer, pk, request)
+        return self.write_object(
+            ShoppingListSerializer, pk, request, body_fields=('servings',)
+        )
+
+    @shopping_cart.mapping.patch
+    def update_shopping_cart(self, request, pk):
+        pk = parse_id(pk)
+        serializer = ShoppingListSerializer(
+            data=request.data, partial=True, context={'request': request, })
+        serializer.is_valid(raise_exception=True)
+        servings = serializer.validated_data.get('servings')
+        if servings is None or not ShoppingList.objects.filter(
+            user=request.user, recipe=pk
+        ).update(servings=servings):
+            return HttpResponse(status=HTTPStatus.BAD_REQUEST)
+
+        return Response({'id': pk, 'servings': servings})
 
     @shopping_cart.mapping.delete
     def delete_shopping_cart(self, request, pk):
-        shopping_cart = ShoppingList.objects.filter(
-            user=self.request.user.id,
-            recipe=pk
+        return delete_object(
+            ShoppingList, user=request.user.id, recipe=parse_id(pk)
+        )
+
+    def get_recipes_response(self, recipes):
+        return Response(ShowRecipeSerializer(
+            recipes, many=True, context=self.get_serializer_context()
+        ).data)
+
+    @action(
+        detail=True,
+        methods=('GET', ),
+    )
+    def similar(self, request, pk):
+        """Похожие рецепты из заранее построенного индекса."""
+
+        recipes = [
+            neighbour.similar for neighbour in SimilarRecipe.objects.filter(
+                recipe=pk
+            ).select_related('similar__author')[:SIMILAR_RECIPES_LIMIT]
+        ]
+        if not recipes and not Recipe.objects.filter(pk=pk).exists():
+            return HttpResponse(status=HTTPStatus.NOT_FOUND)
+
+        return self.get_recipes_response(recipes)
+
+    @action(
+        detail=False,
+        methods=('GET', ),
+        permission_classes=(IsAuthenticated,)
+    )
+    def recommended(self, request):
+        """Рекомендации по соседям рецептов из избранного и корзины."""
+
+        favorites = Favorites.objects.filter(
+            user=request.user
+        ).values('recipe')
+        shopping_list = ShoppingList.objects.filter(
+            user=request.user
+        ).values('recipe')
+        scores = SimilarRecipe.objects.filter(
+            Q(recipe__in=favorites) | Q(recipe__in=shopping_list)
+        ).exclude(
+            similar__in=favorites
+        ).exclude(
+            similar__in=shopping_list
+        ).values('similar').annotate(
+            total=Sum('score')
+        ).order_by('-total').values_list(
+            'similar', flat=True
+        )[:SIMILAR_RECIPES_LIMIT]
+
+        recipe_ids = list(scores)
+        recipes = Recipe.objects.select_related('author').in_bulk(recipe_ids)
+        return self.get_recipes_response(
+            [recipes[pk] for pk in recipe_ids if pk in recipes]
         )
-        if not shopping_cart.exists():
-            return HttpResponse(status=HTTPStatus.BAD_REQUEST)
 
-        shopping_cart.delete()
+    @action(
+        detail=False,
+        methods=('POST', ),
+        permission_classes=(IsAuthenticated,)
+    )
+    def ingredients_summary(self, request):
+        """Суммарные ингредиенты для произвольного набора рецептов."""
 
-        return HttpResponse(status=HTTPStatus.NO_CONTENT)
+        serializer = BulkRecipesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(
+            aggregate_ingredients(serializer.validated_data['recipes'])
+        )
 
     @action(
         detail=False,
@@ -177,13 +415,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def download_shopping_cart(self, request):
         """Функция для получения файла со списком покупок."""
 
-        data = IngredientRecipe.objects.filter(
-            recipe__shopping_list__user=request.user
-        ).values(
-            name=F('ingredient__name'), unit=F('ingredient__measurement_unit')
-        ).annotate(
-            amount=Sum('amount')
-        ).order_by('ingredient__name')
+        data = shopping_cart_totals(request.user)
 
         answer = ''
         for item in data:
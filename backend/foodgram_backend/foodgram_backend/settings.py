@@ -33,12 +33,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.compression.CompressionMiddleware',
+    'api.database.SlowQueryMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'foodgram_backend.urls'
@@ -80,6 +83,74 @@ else:
         }
     }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+    },
+    'throttle': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'foodgram-throttle',
+    },
+}
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+CACHE_SHARED = CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES
+# Кэш ответов и фрагментов рецептов. Инвалидация доходит только до
+# процессов с общим кэшем, поэтому с локальным кэшем он включается
+# лишь в режиме отладки (runserver в одном процессе).
+RESPONSE_CACHE = (os.getenv(
+    'RESPONSE_CACHE', str(CACHE_SHARED or DEBUG)
+) == 'True')
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', 300))
+RECIPE_CACHE_MAX_AGE = int(os.getenv('RECIPE_CACHE_MAX_AGE', 60))
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', 3600))
+
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+# С кэшем Django, локальным для процесса, сброс токена не доходит
+# до других воркеров, поэтому запись живёт всего несколько секунд.
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 60 if CACHE_SHARED else 5))
+TOKEN_CACHE_SHARED = (os.getenv('TOKEN_CACHE_SHARED', 'False') == 'True')
+
+TASKS_BACKEND = os.getenv('TASKS_BACKEND', 'api.queue.ThreadPoolBackend')
+TASKS_WORKERS = int(os.getenv('TASKS_WORKERS', 4))
+TASKS_MAX_ATTEMPTS = int(os.getenv('TASKS_MAX_ATTEMPTS', 3))
+
+THROTTLE_CACHE = os.getenv('THROTTLE_CACHE', 'throttle')
+
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', 5))
+
+APPROXIMATE_COUNT_THRESHOLD = int(
+    os.getenv('APPROXIMATE_COUNT_THRESHOLD', 10000)
+)
+COUNT_CACHE_TIMEOUT = int(os.getenv('COUNT_CACHE_TIMEOUT', 60))
+
+PROFILING_ENABLED = (os.getenv('PROFILING_ENABLED', 'False') == 'True')
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0.01))
+PROFILING_VIEWS = [
+    view for view in os.getenv('PROFILING_VIEWS', '').split(',') if view
+]
+PROFILING_TOKEN = os.getenv('PROFILING_TOKEN', '')
+PROFILING_DIR = os.getenv('PROFILING_DIR', BASE_DIR / 'profiles')
+
+IMPORT_WORKERS = int(os.getenv('IMPORT_WORKERS', 4))
+
+# Миллисекунды, 0 - без ограничения. Экспорт должен укладываться
+# в GUNICORN_TIMEOUT.
+STATEMENT_TIMEOUTS = {
+    'default': int(os.getenv('STATEMENT_TIMEOUT', 5000)),
+    'listing': int(os.getenv('STATEMENT_TIMEOUT_LISTING', 2000)),
+    'export': int(os.getenv('STATEMENT_TIMEOUT_EXPORT', 20000)),
+}
+SLOW_QUERY_MS = int(os.getenv('SLOW_QUERY_MS', 500))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -116,14 +187,42 @@ AUTH_USER_MODEL = 'recipes.FoodgramUser'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
+    # Прокси перед приложением (nginx): клиентский IP для лимитов
+    # берётся из X-Forwarded-For, который они дописывают.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 1)),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.BoundedLimitOffsetPagination',
     'PAGE_SIZE': 6,
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.AnonThrottle',
+        'api.throttling.UserThrottle',
+        'api.throttling.ActionThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': os.getenv('THROTTLE_ANON', '120/min'),
+        'user': os.getenv('THROTTLE_USER', '300/min'),
+        'ingredients_anon': '60/min',
+        'ingredients_user': '120/min',
+        'subscriptions_user': '30/min',
+        'shopping_cart_download_user': '10/min',
+        'ingredients_summary_user': '30/min',
+        'recommended_user': '30/min',
+        'recipes_import_user': '5/min',
+    },
 }
 DJOSER = {
     'SERIALIZERS': {
@@ -0,0 +1,46 @@
+"""
+Профиль настроек для API-воркеров gunicorn.
+
+API работает только с токенами, поэтому сессии, CSRF, сообщения
+и админка не нужны: приложения и middleware для них не загружаются.
+Админка и management-команды используют полный профиль settings.
+"""
+from .settings import *  # noqa: F401, F403
+from .settings import INSTALLED_APPS, MIDDLEWARE, REST_FRAMEWORK, TEMPLATES
+
+API_EXCLUDED_APPS = (
+    'django.contrib.admin',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+)
+API_EXCLUDED_MIDDLEWARE = (
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+)
+
+INSTALLED_APPS = [
+    app for app in INSTALLED_APPS if app not in API_EXCLUDED_APPS
+]
+MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE
+    if middleware not in API_EXCLUDED_MIDDLEWARE
+]
+TEMPLATES = [
+    {
+        **TEMPLATES[0],
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.request',
+            ],
+        },
+    },
+]
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+    ],
+}
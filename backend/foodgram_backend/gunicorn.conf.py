@@ -0,0 +1,53 @@
+"""
+Настройки gunicorn, переопределяются переменными окружения GUNICORN_*.
+
+gthread подходит для API с короткими запросами к БД; gevent требует
+отдельной установки пакета gevent (и psycogreen для PostgreSQL).
+"""
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.getenv(
+    'GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1
+))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+# Код приложения загружается в мастере до fork и разделяется
+# воркерами copy-on-write.
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+
+# Перезапуск воркеров против утечек памяти; jitter разносит
+# перезапуски во времени.
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+# Больше keepalive_timeout в upstream nginx, чтобы соединение
+# закрывал nginx, а не gunicorn.
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 75))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+
+accesslog = os.getenv('GUNICORN_ACCESSLOG') or None
+
+
+def post_fork(server, worker):
+    """Не наследовать от мастера соединения с БД и пул фоновых задач."""
+    if worker_class == 'gevent':
+        try:
+            from psycogreen.gevent import patch_psycopg
+        except ImportError:
+            pass
+        else:
+            patch_psycopg()
+
+    if preload_app:
+        from django.db import connections
+
+        from api.queue import get_backend
+
+        connections.close_all()
+        get_backend.cache_clear()
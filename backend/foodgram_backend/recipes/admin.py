@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.models import Group
 from django.contrib.auth.admin import UserAdmin
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils.safestring import mark_safe
 
 from .models import (Tag, Ingredient, Recipe,
@@ -8,10 +10,27 @@ from .models import (Tag, Ingredient, Recipe,
                      ShoppingList)
 
 
+def count_related(model, name):
+    """
+    Число связанных записей обратной связи name коррелированным
+    подзапросом: без JOIN и GROUP BY по всей таблице списка.
+    """
+    relation = model._meta.get_field(name)
+    field = relation.field.name
+    return Coalesce(Subquery(
+        relation.related_model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            count=Count('pk')
+        ).values('count')
+    ), 0)
+
+
 class IngredientInline(admin.StackedInline):
     model = Ingredient.recipes.through
     extra = 1
     min_num = 1
+    autocomplete_fields = ('ingredient',)
 
 
 @admin.register(Tag)
@@ -36,16 +55,29 @@ class FoodgramUserAdmin(UserAdmin):
         'get_recipies',
         'get_followers',
     )
-    search_fields = ('username', 'email',)
-    list_filter = ('first_name', 'email',)
+    search_fields = ('username', 'email', 'first_name', 'last_name',)
+    list_filter = ('is_staff', 'is_superuser', 'is_active',)
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            recipes_count=count_related(self.model, 'recipes'),
+            followers_count=count_related(self.model, 'author'),
+        )
 
-    @admin.display(description='Кол-во рецептов', )
+    @admin.display(
+        description='Кол-во рецептов',
+        ordering='recipes_count',
+    )
     def get_recipies(self, obj):
-        return obj.recipes.count()
+        return obj.recipes_count
 
-    @admin.display(description='Кол-во подписчиков', )
+    @admin.display(
+        description='Кол-во подписчиков',
+        ordering='followers_count',
+    )
     def get_followers(self, obj):
-        return obj.author.count()
+        return obj.followers_count
 
 
 @admin.register(Recipe)
@@ -59,14 +91,24 @@ class Recipe(admin.ModelAdmin):
         'get_favorites',
         'get_ingredient',
     )
-    list_filter = ('author', 'tags',)
+    list_filter = ('tags',)
+    list_select_related = ('author',)
+    search_fields = ('name', 'author__username', 'author__email',)
+    autocomplete_fields = ('author',)
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            favorites_count=count_related(self.model, 'favorites'),
+        ).prefetch_related('ingredient_recipe__ingredient')
 
     @admin.display(
         description='В избранном',
+        ordering='favorites_count',
     )
     def get_favorites(self, obj):
         """Получения количества добавлений в избранное."""
-        return obj.favorites.count()
+        return obj.favorites_count
 
     @admin.display(
         description='Ингредиенты',
@@ -92,7 +134,7 @@ class Ingredient(admin.ModelAdmin):
         'id',
     )
     search_fields = ('name',)
-    list_filter = ('name', 'measurement_unit')
+    list_filter = ('measurement_unit',)
 
 
 @admin.register(Subscription)
@@ -101,8 +143,10 @@ class Subscription(admin.ModelAdmin):
         'follower',
         'author',
     )
-    search_fields = ('follower',)
-    list_filter = ('follower',)
+    list_select_related = ('follower', 'author',)
+    search_fields = ('follower__username', 'author__username',)
+    autocomplete_fields = ('follower', 'author',)
+    show_full_result_count = False
 
 
 @admin.register(Favorites)
@@ -111,8 +155,10 @@ class FavoritesAdmin(admin.ModelAdmin):
         'user',
         'recipe',
     )
-    search_fields = ('user',)
-    list_filter = ('user', 'recipe')
+    list_select_related = ('user', 'recipe',)
+    search_fields = ('user__username', 'recipe__name',)
+    autocomplete_fields = ('user', 'recipe',)
+    show_full_result_count = False
 
 
 @admin.register(ShoppingList)
@@ -121,8 +167,10 @@ class ShoppingList(admin.ModelAdmin):
         'user',
         'recipe',
     )
-    search_fields = ('user',)
-    list_filter = ('user', 'recipe')
+    list_select_related = ('user', 'recipe',)
+    search_fields = ('user__username', 'recipe__name',)
+    autocomplete_fields = ('user', 'recipe',)
+    show_full_result_count = False
 
 
 admin.site.unregister(Group)
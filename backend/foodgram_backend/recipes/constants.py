@@ -4,3 +4,14 @@ NAME_STR_LIMIT = 150
 EMAIL_LIMIT = 254
 MIN_VALUE = 1
 MAX_VALUE = 32767
+BULK_LIMIT = 100
+MAX_SERVINGS = 100
+SIMILAR_RECIPES_LIMIT = 20
+MAX_PAGE_LIMIT = 100
+MAX_RECIPES_LIMIT = 20
+IMPORT_LIMIT = 100
+IMPORT_BATCH_SIZE = 500
+UNIT_CONVERSIONS = {
+    'кг': ('г', 1000),
+    'л': ('мл', 1000),
+}
@@ -1,5 +1,5 @@
 from colorfield.fields import ColorField
-from django.db import models
+from django.db import connections, models
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import (RegexValidator, MinValueValidator,
                                     MaxValueValidator)
@@ -7,7 +7,46 @@ from django.core.exceptions import ValidationError
 
 from .constants import (EMAIL_LIMIT, NAME_STR_LIMIT,
                         SHORT_NAME_LEN, TITLE_STR_LIMIT,
-                        MIN_VALUE, MAX_VALUE)
+                        MIN_VALUE, MAX_VALUE, MAX_SERVINGS)
+from .storage import ContentHashStorage, recipe_image_path
+
+
+class RelationQuerySet(models.QuerySet):
+    """QuerySet связующих моделей с атомарным добавлением записи."""
+
+    def add(self, **fields):
+        """
+        Добавляет запись одним INSERT ... ON CONFLICT DO NOTHING.
+
+        Возвращает созданный объект или None, если такая запись уже есть.
+        """
+        opts = self.model._meta
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        obj = self.model(**fields)
+        concrete_fields = [
+            field for field in opts.concrete_fields if field != opts.pk
+        ]
+        columns = [field.column for field in concrete_fields]
+        params = [
+            field.get_db_prep_save(getattr(obj, field.attname), connection)
+            for field in concrete_fields
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {quote(opts.db_table)} '
+                f'({", ".join(map(quote, columns))}) '
+                f'VALUES ({", ".join(["%s"] * len(params))}) '
+                f'ON CONFLICT DO NOTHING RETURNING {quote(opts.pk.column)}',
+                params
+            )
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        obj.pk = row[0]
+        obj._state.adding = False
+        obj._state.db = self.db
+        return obj
 
 
 class NameModel(models.Model):
@@ -112,7 +151,8 @@ class Recipe(NameModel):
     )
     image = models.ImageField(
         'Изображение',
-        upload_to='',
+        upload_to=recipe_image_path,
+        storage=ContentHashStorage(),
     )
     text = models.TextField('Описание',)
     cooking_time = models.PositiveSmallIntegerField(
@@ -204,6 +244,8 @@ class Subscription(models.Model):
         blank=True,
     )
 
+    objects = RelationQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'подписка'
         verbose_name_plural = 'Подписки'
@@ -237,6 +279,8 @@ class UserRecipeModel(models.Model):
         verbose_name='Рецепт',
     )
 
+    objects = RelationQuerySet.as_manager()
+
     class Meta:
         abstract = True
         ordering = ('user',)
@@ -265,6 +309,17 @@ class Favorites(UserRecipeModel):
 class ShoppingList(UserRecipeModel):
     """Модель списка покупок."""
 
+    servings = models.PositiveSmallIntegerField(
+        'Количество порций',
+        default=MIN_VALUE,
+        validators=(
+            MinValueValidator(MIN_VALUE, message=f'Минимум - {MIN_VALUE}.'),
+            MaxValueValidator(
+                MAX_SERVINGS, message=f'Максимум - {MAX_SERVINGS}.'
+            ),
+        ),
+    )
+
     class Meta(UserRecipeModel.Meta):
         verbose_name = 'список покупок'
         verbose_name_plural = 'Списки покупок'
@@ -275,3 +330,40 @@ class ShoppingList(UserRecipeModel):
                 name='unique_shopping_list'
             ),
         )
+
+
+class SimilarRecipe(models.Model):
+    """Сосед рецепта в индексе рекомендаций."""
+
+    recipe = models.ForeignKey(
+        Recipe,
+        related_name='similar',
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        related_name='+',
+        on_delete=models.CASCADE,
+        verbose_name='Похожий рецепт',
+    )
+    score = models.FloatField('Сходство')
+
+    class Meta:
+        verbose_name = 'похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        ordering = ('recipe', '-score')
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'similar'),
+                name='unique_similar_recipe'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('recipe', '-score'), name='similar_recipe_score'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe} ~ {self.similar}'
@@ -0,0 +1,42 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentHashStorage(FileSystemStorage):
+    """
+    Хранилище файлов с именами по хэшу содержимого.
+
+    Одинаковое имя означает одинаковое содержимое, поэтому уже
+    существующий файл не перезаписывается и не получает суффикс.
+    """
+
+    # Без O_EXCL: одновременная запись того же файла не приводит
+    # к бесконечному подбору свободного имени.
+    OS_OPEN_FLAGS = (
+        os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+    )
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        if self.exists(name):
+            return name
+        return super()._save(name, content)
+
+
+def content_hash_path(file, directory, filename):
+    """Путь вида directory/ab/cd/<sha256><расширение>."""
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    name = digest.hexdigest()
+    extension = os.path.splitext(filename)[1].lower()
+    return f'{directory}/{name[:2]}/{name[2:4]}/{name}{extension}'
+
+
+def recipe_image_path(instance, filename):
+    return content_hash_path(instance.image, 'recipes', filename)